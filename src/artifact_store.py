@@ -0,0 +1,194 @@
+from collections import OrderedDict
+from typing import Optional
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# 引用前缀，便于区分引用和普通文本
+REF_PREFIX = "sha256:"
+
+# 两次清理过期落盘文本之间的最短间隔（秒）
+CLEANUP_INTERVAL_SECONDS = 600
+
+
+class ArtifactStore:
+    """按内容寻址的大文本存储
+
+    工作流状态中只保存文本的引用（内容的sha256），文本本身保存在内存缓存中。
+    内存缓存超过上限时，按LRU顺序把最久未使用的文本落盘，读取时再从磁盘加载。
+    相同内容只保存一份，可在同一进程的多个并发运行之间共享。
+    落盘文本在超过ttl_seconds未被访问后删除，避免长期运行的worker占满磁盘。
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        max_memory_bytes: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+    ):
+        """初始化ArtifactStore
+
+        Args:
+            cache_dir: 落盘目录，默认使用配置文件中的值
+            max_memory_bytes: 内存缓存上限（字节），默认使用配置文件中的值
+            ttl_seconds: 落盘文本未被访问多久后删除（秒），默认使用配置文件中的值
+        """
+        self.cache_dir = cache_dir or settings.artifact_dir
+        if max_memory_bytes is None:
+            max_memory_bytes = settings.artifact_cache_mb * 1024 * 1024
+        self.max_memory_bytes = max_memory_bytes
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.artifact_ttl_hours * 3600
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._last_cleanup = 0.0
+
+    def put(self, text: str) -> str:
+        """保存文本，返回其引用"""
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        ref = REF_PREFIX + digest
+        with self._lock:
+            if ref in self._cache:
+                self._cache.move_to_end(ref)
+                return ref
+            if self._touch(self._path(digest)):
+                return ref
+            self._cache[ref] = text
+            self._memory_bytes += self._size(text)
+            spilled = self._spill()
+        if spilled:
+            self._maybe_cleanup()
+        return ref
+
+    def get(self, ref: str) -> str:
+        """根据引用读取文本，空引用返回空字符串
+
+        Raises:
+            KeyError: 引用不存在
+        """
+        if not ref:
+            return ""
+        with self._lock:
+            if ref in self._cache:
+                self._cache.move_to_end(ref)
+                return self._cache[ref]
+        path = self._path(self._digest(ref))
+        if not self._touch(path):
+            raise KeyError(f"Artifact not found: {ref}")
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    async def aput(self, text: str) -> str:
+        """put的异步版本，可能落盘和清理过期文本，在线程中执行以免阻塞事件循环"""
+        return await asyncio.to_thread(self.put, text)
+
+    async def aget(self, ref: str) -> str:
+        """get的异步版本，命中内存缓存时直接返回，需要从磁盘加载时在线程中读取"""
+        with self._lock:
+            if not ref:
+                return ""
+            if ref in self._cache:
+                self._cache.move_to_end(ref)
+                return self._cache[ref]
+        return await asyncio.to_thread(self.get, ref)
+
+    @property
+    def memory_bytes(self) -> int:
+        """当前内存缓存占用的字节数"""
+        return self._memory_bytes
+
+    def cleanup(self, max_age_seconds: Optional[float] = None) -> int:
+        """删除超过max_age_seconds未被访问的落盘文本
+
+        Args:
+            max_age_seconds: 最长未访问时间（秒），默认为ttl_seconds
+
+        Returns:
+            删除的文件数
+        """
+        max_age_seconds = self.ttl_seconds if max_age_seconds is None else max_age_seconds
+        cutoff = time.time() - max_age_seconds
+        removed = 0
+        if not os.path.isdir(self.cache_dir):
+            return removed
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except FileNotFoundError:
+                    # 其他进程已删除
+                    continue
+        if removed:
+            logger.info(f"Removed {removed} expired artifacts from {self.cache_dir}")
+        return removed
+
+    def _maybe_cleanup(self) -> None:
+        """距上次清理超过CLEANUP_INTERVAL_SECONDS时清理过期的落盘文本"""
+        now = time.monotonic()
+        with self._lock:
+            if self._last_cleanup and now - self._last_cleanup < CLEANUP_INTERVAL_SECONDS:
+                return
+            self._last_cleanup = now
+        self.cleanup()
+
+    @staticmethod
+    def _touch(path: str) -> bool:
+        """更新落盘文本的访问时间（修改时间），文件不存在时返回False"""
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _spill(self) -> int:
+        """把超出内存上限的文本按LRU顺序写入磁盘（调用方需持有锁），返回落盘的文本数"""
+        spilled = 0
+        while self._memory_bytes > self.max_memory_bytes and self._cache:
+            ref, text = self._cache.popitem(last=False)
+            self._memory_bytes -= self._size(text)
+            path = self._path(self._digest(ref))
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(text)
+                os.replace(tmp_path, path)
+            spilled += 1
+            logger.debug(f"Spilled artifact {ref} to {path}")
+        return spilled
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.txt")
+
+    @staticmethod
+    def _digest(ref: str) -> str:
+        if not ref.startswith(REF_PREFIX):
+            raise KeyError(f"Invalid artifact reference: {ref}")
+        return ref[len(REF_PREFIX):]
+
+    @staticmethod
+    def _size(text: str) -> int:
+        return len(text.encode("utf-8"))
+
+
+_default_store: Optional[ArtifactStore] = None
+_default_store_lock = threading.Lock()
+
+
+def get_artifact_store() -> ArtifactStore:
+    """获取进程内共享的ArtifactStore实例"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = ArtifactStore()
+        return _default_store
@@ -0,0 +1,382 @@
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Type
+from langchain_core.runnables import RunnableConfig
+from langgraph.graph.state import CompiledStateGraph
+import asyncio
+import functools
+import json
+import logging
+import os
+
+from .config import settings
+from .model_client import ModelClient
+from .prompt_manager import PromptManager
+from .artifact_store import get_artifact_store
+from .deadline import Deadline, DeadlineExceeded
+from .schemas import PlanModel, OverallPlan, DailyPlan
+from .plan_repair import PlanValidationError, avalidate_plan
+from .workflow import (
+    DailyBatchPlanner,
+    PlanState,
+    advance_winners,
+    compare_plans_prompt,
+    create_run_config,
+    create_workflow,
+    critical_think_prompt,
+    critique_candidates,
+    daily_plan_prompt,
+    daily_repair_context,
+    final_plan_prompt,
+    finish_daily_plans,
+    finish_run,
+    finish_tournament,
+    get_deadline,
+    get_run_resources,
+    get_week_ranges,
+    initial_state,
+    save_daily_plan,
+    save_final_plan,
+    save_plans,
+    skip_comparison,
+    stop_daily_plans,
+    stop_tournament,
+    tournament_groups,
+    tournament_round_prompts,
+    use_tournament,
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def agenerate_initial_plan(state: PlanState, config: RunnableConfig) -> PlanState:
+    """生成初始学习计划（异步）"""
+    logger.info("=== Entering generate_initial_plan node ===")
+    try:
+        model_client, prompt_manager = get_run_resources(config, "generate_initial_plan")
+        store = get_artifact_store()
+        prompt = prompt_manager.get_prompt(
+            "initial_plan",
+            user_background=state.user_background,
+            user_goal=state.user_goal
+        )
+
+        logger.debug("Calling model to generate initial plan...")
+        state.initial_plan_ref = await store.aput(await model_client.agenerate(prompt))
+        logger.info("Initial plan generated successfully")
+        logger.info("=== Exiting generate_initial_plan node ===")
+        return state
+    except Exception as e:
+        logger.error(f"Error in generate_initial_plan node: {e}")
+        logger.exception("Full error traceback:")
+        raise
+
+
+async def acritique_plan(state: PlanState, config: RunnableConfig) -> PlanState:
+    """对初始计划进行批判性审查（异步），多份修正计划并发生成"""
+    logger.info("=== Entering critique_plan node ===")
+    try:
+        model_client, prompt_manager = get_run_resources(config, "critique_plan")
+        store = get_artifact_store()
+        candidates = critique_candidates(state, get_deadline(config))
+        logger.debug(f"Starting critique process, will generate {candidates} revised plans...")
+
+        prompt = critical_think_prompt(prompt_manager, state, await store.aget(state.initial_plan_ref))
+        # 多份修正计划需要独立采样，不与进行中的相同调用合并
+        revised_plans = await asyncio.gather(
+            *(model_client.agenerate(prompt, coalesce=False) for _ in range(candidates))
+        )
+        state.revised_plan_refs = list(await asyncio.gather(*(store.aput(plan) for plan in revised_plans)))
+        logger.info(f"Generated {len(state.revised_plan_refs)} revised plans")
+        logger.info("=== Exiting critique_plan node ===")
+        return state
+    except Exception as e:
+        logger.error(f"Error in critique_plan node: {e}")
+        logger.exception("Full error traceback:")
+        raise
+
+
+async def acompare_plans_tournament(
+    state: PlanState, model_client: ModelClient, prompt_manager: PromptManager, deadline: Deadline
+) -> None:
+    """淘汰赛方式对比（异步）：每轮各组并发对比，胜出者晋级"""
+    pool = list(range(len(state.revised_plan_refs)))
+    notes: List[str] = []
+    round_no = 0
+    while len(pool) > max(1, settings.compare_top_candidates):
+        if round_no and stop_tournament(state, deadline, round_no):
+            break
+        round_no += 1
+        groups = tournament_groups(pool)
+        # 构建prompt时需读取修正计划，可能从磁盘加载
+        prompts = await asyncio.to_thread(tournament_round_prompts, prompt_manager, state, groups)
+        logger.info(f"Tournament round {round_no}: comparing {len(pool)} plans in {len(groups)} groups")
+        results = iter(await asyncio.gather(
+            *(model_client.agenerate(prompt) for prompt in prompts if prompt is not None)
+        ))
+        # 轮空的组没有对比结果
+        comparisons = [next(results) if prompt is not None else None for prompt in prompts]
+        pool, round_notes = advance_winners(round_no, groups, comparisons)
+        notes.extend(round_notes)
+    await asyncio.to_thread(finish_tournament, state, pool, notes)
+
+
+async def acompare_plans(state: PlanState, config: RunnableConfig) -> PlanState:
+    """对比修正计划，分析它们的优点和缺点（异步）"""
+    logger.info("=== Entering compare_plans node ===")
+    try:
+        deadline = get_deadline(config)
+        if skip_comparison(state, deadline):
+            logger.info("=== Exiting compare_plans node ===")
+            return state
+
+        model_client, prompt_manager = get_run_resources(config, "compare_plans")
+        store = get_artifact_store()
+        if use_tournament(state):
+            await acompare_plans_tournament(state, model_client, prompt_manager, deadline)
+            logger.info("=== Exiting compare_plans node ===")
+            return state
+
+        prompt = compare_plans_prompt(
+            prompt_manager,
+            state.original_question,
+            list(enumerate(await asyncio.gather(*(store.aget(ref) for ref in state.revised_plan_refs)))),
+        )
+
+        logger.debug("Calling model to compare plans...")
+        state.comparison_result_ref = await store.aput(await model_client.agenerate(prompt))
+        logger.info("Plans compared successfully")
+        logger.info("=== Exiting compare_plans node ===")
+        return state
+    except Exception as e:
+        logger.error(f"Error in compare_plans node: {e}")
+        logger.exception("Full error traceback:")
+        raise
+
+
+async def agenerate_final_plan(state: PlanState, config: RunnableConfig) -> PlanState:
+    """生成最终的双周粒度计划（异步）"""
+    logger.info("=== Entering generate_final_plan node ===")
+    try:
+        model_client, prompt_manager = get_run_resources(config, "generate_final_plan")
+        store = get_artifact_store()
+        prompt = await asyncio.to_thread(final_plan_prompt, prompt_manager, state)
+
+        logger.debug("Calling model to generate final plan...")
+        final_plan = await model_client.agenerate(prompt)
+        state.final_plan_ref = await store.aput(final_plan)
+        logger.info("Final plan generated successfully")
+
+        # 立即保存最终计划，修复调用失败或超时也不会丢失已生成的计划
+        # 文件写入放到线程中执行，不阻塞事件循环
+        logger.info("Saving final plan immediately...")
+        await asyncio.to_thread(save_final_plan, state.output_dir, final_plan)
+
+        # 校验最终计划，只修复未通过校验的片段
+        repaired_plan = await arepair_plan_text(
+            final_plan, OverallPlan, model_client, prompt_manager, state.original_question
+        )
+        if repaired_plan != final_plan:
+            state.final_plan_ref = await store.aput(repaired_plan)
+            await asyncio.to_thread(save_final_plan, state.output_dir, repaired_plan)
+
+        logger.info("=== Exiting generate_final_plan node ===")
+        return state
+    except Exception as e:
+        logger.error(f"Error in generate_final_plan node: {e}")
+        logger.exception("Full error traceback:")
+        raise
+
+
+async def arepair_plan_text(
+    text: str,
+    schema: Type[PlanModel],
+    model_client: ModelClient,
+    prompt_manager: PromptManager,
+    context: str,
+) -> str:
+    """repair_plan_text的异步版本"""
+    try:
+        plan = await avalidate_plan(text, schema, model_client, prompt_manager, context)
+    except PlanValidationError as e:
+        logger.warning(f"Plan could not be repaired, keeping raw output: {e}")
+        return text
+    return json.dumps(plan.model_dump(), indent=2, ensure_ascii=False)
+
+
+async def agenerate_daily_plan(
+    model_client: ModelClient,
+    prompt_manager: PromptManager,
+    user_background: str,
+    final_plan: str,
+    week_range: str,
+) -> str:
+    """generate_daily_plan的异步版本"""
+    prompt = daily_plan_prompt(prompt_manager, user_background, final_plan, week_range)
+    logger.debug(f"Calling model to generate daily plan for {week_range}...")
+    daily_plan = await model_client.agenerate(prompt)
+    # 校验日计划，只修复未通过校验的某一天
+    return await arepair_plan_text(
+        daily_plan,
+        DailyPlan,
+        model_client,
+        prompt_manager,
+        daily_repair_context(user_background, final_plan, week_range),
+    )
+
+
+async def agenerate_daily_plans_batched(
+    model_client: ModelClient,
+    prompt_manager: PromptManager,
+    user_background: str,
+    final_plan: str,
+    week_ranges: List[str],
+) -> AsyncIterator[Tuple[str, str]]:
+    """generate_daily_plans_batched的异步版本"""
+    planner = DailyBatchPlanner(model_client, prompt_manager, user_background, final_plan, week_ranges)
+    while True:
+        batch = planner.next_batch()
+        if batch is None:
+            break
+        message = await model_client.agenerate_message(planner.prompt(batch), max_tokens=planner.budget)
+        completed = []
+        for week_range, period, context in planner.periods(batch, message):
+            try:
+                daily_plan = await avalidate_plan(period, DailyPlan, model_client, prompt_manager, context)
+            except PlanValidationError as e:
+                logger.warning(f"Daily plan for {week_range} from batch failed validation: {e}")
+                continue
+            completed.append(week_range)
+            yield week_range, json.dumps(daily_plan.model_dump(), indent=2, ensure_ascii=False)
+        planner.finish_batch(batch, message, completed)
+
+    for week_range in planner.retry_individually:
+        logger.info(f"Generating daily plan for {week_range} individually...")
+        yield week_range, await agenerate_daily_plan(
+            model_client, prompt_manager, user_background, final_plan, week_range
+        )
+
+
+async def _aiter_daily_plans(
+    model_client: ModelClient,
+    prompt_manager: PromptManager,
+    user_background: str,
+    final_plan: str,
+    week_ranges: List[str],
+) -> AsyncIterator[Tuple[str, str]]:
+    """逐个双周生成日计划"""
+    for week_range in week_ranges:
+        yield week_range, await agenerate_daily_plan(
+            model_client, prompt_manager, user_background, final_plan, week_range
+        )
+
+
+async def agenerate_daily_plans(state: PlanState, config: RunnableConfig) -> PlanState:
+    """为每双周生成详细的日粒度计划（异步）"""
+    logger.info("=== Entering generate_daily_plans node ===")
+    try:
+        week_ranges = get_week_ranges()
+        total_weeks = len(week_ranges)
+        logger.info(f"Will generate daily plans for {total_weeks} bi-weekly periods")
+
+        model_client, prompt_manager = get_run_resources(config, "generate_daily_plans")
+        store = get_artifact_store()
+        final_plan = await store.aget(state.final_plan_ref)
+        daily_dir = os.path.join(state.output_dir, "daily")
+        await asyncio.to_thread(os.makedirs, daily_dir, exist_ok=True)
+
+        generate = agenerate_daily_plans_batched if settings.daily_batch_mode else _aiter_daily_plans
+        daily_plans = generate(model_client, prompt_manager, state.user_background, final_plan, week_ranges)
+
+        # 剩余时间不足或超过截止时间时停止生成，余下的双周记为待生成
+        deadline = get_deadline(config)
+        daily_plan_refs = {}
+        try:
+            while not stop_daily_plans(deadline):
+                try:
+                    week_range, daily_plan = await daily_plans.__anext__()
+                except StopAsyncIteration:
+                    break
+                except DeadlineExceeded as e:
+                    logger.warning(f"Daily plan generation stopped: {e}")
+                    break
+                daily_plan_refs[week_range] = await store.aput(daily_plan)
+                logger.info(f"Daily plan for {week_range} generated successfully ({len(daily_plan_refs)}/{total_weeks})")
+                await asyncio.to_thread(save_daily_plan, daily_dir, week_range, daily_plan)
+        finally:
+            await daily_plans.aclose()
+
+        finish_daily_plans(state, week_ranges, daily_plan_refs)
+        logger.info("=== Exiting generate_daily_plans node ===")
+        return state
+    except Exception as e:
+        logger.error(f"Error in generate_daily_plans node: {e}")
+        logger.exception("Full error traceback:")
+        raise
+
+
+async def asave_plans(state: PlanState) -> PlanState:
+    """保存生成的计划到文件（异步），文件写入放到线程中执行"""
+    return await asyncio.to_thread(save_plans, state)
+
+
+# 异步工作流节点，与WORKFLOW_NODES一一对应
+ASYNC_WORKFLOW_NODES = {
+    "generate_initial_plan": agenerate_initial_plan,
+    "critique_plan": acritique_plan,
+    "compare_plans": acompare_plans,
+    "generate_final_plan": agenerate_final_plan,
+    "generate_daily_plans": agenerate_daily_plans,
+    "save_plans": asave_plans,
+}
+
+
+@functools.lru_cache(maxsize=None)
+def get_async_app() -> CompiledStateGraph:
+    """编译异步工作流图，编译结果不含运行状态，在所有运行之间共享"""
+    return create_workflow(ASYNC_WORKFLOW_NODES).compile()
+
+
+async def arun_workflow(
+    user_background: str,
+    user_goal: str,
+    output_dir: Optional[str] = None,
+    node_models: Optional[Dict[str, str]] = None,
+    deadline_seconds: Optional[float] = None,
+) -> Dict[str, Any]:
+    """run_workflow的异步版本
+
+    节点中的模型调用基于ainvoke，文件写入放到线程中执行，
+    同一个事件循环可以并发驱动大量运行，每个运行不再占用一个线程。
+    不采样进程RSS（同一事件循环中的并发运行无法区分各自的内存占用），
+    也不支持性能分析。
+
+    Args:
+        user_background: 用户的技术背景介绍
+        user_goal: 用户的学习目标
+        output_dir: 输出目录，默认使用配置文件中的值
+        node_models: 按节点覆盖的模型配置，如{"compare_plans": "deepseek:deepseek-reasoner"}
+        deadline_seconds: 本次运行的时间预算（秒），默认使用配置文件中的值
+
+    Returns:
+        包含最终状态的字典，字段与run_workflow的返回值相同，内存指标为None
+
+    Raises:
+        DeadlineExceeded: 生成最终计划之前就超过了截止时间
+    """
+    logger.info("=== Starting async workflow execution ===")
+    try:
+        app = get_async_app()
+        # PromptManager初始化时读取模板文件
+        prompt_manager = await asyncio.to_thread(PromptManager)
+        config = create_run_config(node_models, deadline_seconds, prompt_manager)
+
+        logger.info("=== Invoking async workflow ===")
+        result = await app.ainvoke(
+            initial_state(user_background, user_goal, output_dir), config=config
+        )
+        result = await asyncio.to_thread(finish_run, result, config)
+        logger.info("=== Async workflow execution completed successfully ===")
+        return result
+    except Exception as e:
+        logger.error(f"Error running async workflow: {e}")
+        logger.exception("Full error traceback:")
+        raise
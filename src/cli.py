@@ -1,10 +1,11 @@
 import typer
 import logging
-from typing import Optional
+from typing import Dict, List, Optional
 import os
 from logging.handlers import RotatingFileHandler
 from .config import settings
-from .workflow import run_workflow
+from .job_queue import create_job_queue
+from .workflow import run_workflow, regenerate_daily_plans, daily_plan_filename
 
 # 初始化Typer应用
 app = typer.Typer(
@@ -57,6 +58,19 @@ if settings.log_to_file:
 logger = logging.getLogger(__name__)
 
 
+def _parse_node_models(node_models: List[str]) -> Dict[str, str]:
+    """解析命令行中"节点=平台:模型"格式的模型路由配置"""
+    routes = {}
+    for item in node_models:
+        node, sep, spec = item.partition("=")
+        if not sep or not node.strip() or not spec.strip():
+            raise typer.BadParameter(
+                f"Invalid --node-model {item!r}, expected e.g. 'compare_plans=deepseek:deepseek-reasoner'"
+            )
+        routes[node.strip()] = spec.strip()
+    return routes
+
+
 @app.command()
 def generate(
     background_file: str = typer.Option(
@@ -71,6 +85,18 @@ def generate(
     output_dir: Optional[str] = typer.Option(
         None, "--output-dir", "-o", help="输出目录，默认使用配置文件中的值"
     ),
+    node_models: List[str] = typer.Option(
+        [],
+        "--node-model",
+        "-m",
+        help='按节点指定模型，格式为"节点=平台:模型"，如"compare_plans=deepseek:deepseek-reasoner"，可多次指定',
+    ),
+    deadline: Optional[float] = typer.Option(
+        None, "--deadline", help="本次运行的时间预算（秒），临近时自动降级，默认使用配置文件中的值"
+    ),
+    profile: bool = typer.Option(
+        False, "--profile", help="采样分析本地计算开销，火焰图和热点汇总写入输出目录下的profile/"
+    ),
     verbose: bool = typer.Option(False, "--verbose", "-v", help="启用详细日志输出"),
 ):
     """生成个性化学习计划"""
@@ -92,15 +118,25 @@ def generate(
         logger.info(f"从文件读取学习目标: {goal_file}")
 
         # 调用工作流生成计划
-        result = run_workflow(background, goal, output_dir)
+        result = run_workflow(
+            background, goal, output_dir, _parse_node_models(node_models), deadline, profile
+        )
 
+        result_dir = result["output_dir"]
         logger.info("学习计划生成完成！")
-        logger.info(f"总计划已保存到: {result.output_dir}/overall_plan.md")
-        logger.info(f"日粒度计划已保存到: {result.output_dir}/daily/")
+        logger.info(f"总计划已保存到: {result_dir}/overall_plan.md")
+        logger.info(f"日粒度计划已保存到: {result_dir}/daily/")
 
         typer.echo("✅ 学习计划生成完成！")
-        typer.echo(f"📋 总计划已保存到: {result.output_dir}/overall_plan.md")
-        typer.echo(f"📅 日粒度计划已保存到: {result.output_dir}/daily/")
+        typer.echo(f"📋 总计划已保存到: {result_dir}/overall_plan.md")
+        typer.echo(f"📅 日粒度计划已保存到: {result_dir}/daily/")
+        if profile:
+            typer.echo(f"🔥 性能分析已保存到: {result_dir}/profile/")
+        if result["degradations"]:
+            typer.echo(f"⚠️ 因时间不足已降级: {', '.join(result['degradations'])}")
+        if result["pending_periods"]:
+            typer.echo(f"⏳ 以下双周的日计划尚未生成: {', '.join(result['pending_periods'])}")
+            typer.echo(f"   可运行 planer regenerate --run {result_dir} --pending 补齐")
 
     except FileNotFoundError as e:
         logger.error(f"文件未找到: {e}")
@@ -112,6 +148,258 @@ def generate(
         raise typer.Exit(code=1)
 
 
+@app.command()
+def regenerate(
+    run_dir: str = typer.Option(
+        ..., "--run", "-r", help="已有的计划输出目录（包含overall_plan.md）"
+    ),
+    weeks: List[str] = typer.Option(
+        [],
+        "--weeks",
+        "-w",
+        help='需要重新生成的双周范围，如"Week 5-6"，可多次指定或用逗号分隔',
+    ),
+    pending: bool = typer.Option(
+        False, "--pending", help="生成运行清单中因超时尚未生成的双周"
+    ),
+    background_file: Optional[str] = typer.Option(
+        None,
+        "--background-file",
+        "-bf",
+        help="包含个人技术背景介绍的文件路径，默认从运行清单中读取",
+    ),
+    node_models: List[str] = typer.Option(
+        [],
+        "--node-model",
+        "-m",
+        help='按节点指定模型，格式为"节点=平台:模型"，如"compare_plans=deepseek:deepseek-reasoner"，可多次指定',
+    ),
+    verbose: bool = typer.Option(False, "--verbose", "-v", help="启用详细日志输出"),
+):
+    """只重新生成已有计划中指定双周的日粒度计划"""
+    try:
+        if verbose:
+            logging.getLogger().setLevel(logging.DEBUG)
+
+        # 支持 --weeks "Week 1-2,Week 5-6" 的写法
+        week_ranges = [w.strip() for item in weeks for w in item.split(",") if w.strip()]
+        if not week_ranges and not pending:
+            raise typer.BadParameter("请通过 --weeks 指定双周范围，或使用 --pending")
+        logger.info(f"开始重新生成日粒度计划: {', '.join(week_ranges) or '待生成的双周'}")
+
+        background = None
+        if background_file:
+            with open(background_file, "r", encoding="utf-8") as f:
+                background = f.read().strip()
+            logger.info(f"从文件读取背景信息: {background_file}")
+
+        daily_plans = regenerate_daily_plans(
+            run_dir, week_ranges or None, background, node_models=_parse_node_models(node_models)
+        )
+
+        if not daily_plans:
+            logger.info("没有待生成的双周，无需重新生成")
+            typer.echo("✅ 没有待生成的双周，无需重新生成")
+            return
+
+        logger.info("日粒度计划重新生成完成！")
+        typer.echo("✅ 日粒度计划重新生成完成！")
+        for week_range in daily_plans:
+            typer.echo(f"📅 {week_range} 已更新到: {run_dir}/daily/{daily_plan_filename(week_range)}")
+
+    except FileNotFoundError as e:
+        logger.error(f"文件未找到: {e}")
+        typer.echo(f"❌ 文件未找到: {e}", err=True)
+        raise typer.Exit(code=1)
+    except Exception as e:
+        logger.error(f"重新生成日粒度计划时出错: {e}")
+        typer.echo(f"❌ 重新生成日粒度计划时出错: {e}", err=True)
+        raise typer.Exit(code=1)
+
+
+def _read_text(path: str) -> str:
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().strip()
+
+
+def _load_batch_payloads(batch_file: str) -> List[dict]:
+    """读取批量任务文件（JSONL），每行包含background/background_file、goal/goal_file和可选的output_dir、deadline_seconds"""
+    import json
+
+    payloads = []
+    with open(batch_file, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            background = item.get("background") or _read_text(item["background_file"])
+            goal = item.get("goal") or _read_text(item["goal_file"])
+            if not background or not goal:
+                raise ValueError(f"{batch_file}:{line_no} 缺少背景或目标")
+            payloads.append({
+                "user_background": background,
+                "user_goal": goal,
+                "output_dir": item.get("output_dir"),
+                "deadline_seconds": item.get("deadline_seconds"),
+            })
+    return payloads
+
+
+@app.command()
+def enqueue(
+    background_file: str = typer.Option(
+        "background.txt",
+        "--background-file",
+        "-bf",
+        help="包含个人技术背景介绍的文件路径",
+    ),
+    goal_file: str = typer.Option(
+        "goal.txt", "--goal-file", "-gf", help="包含学习目标的文件路径"
+    ),
+    batch_file: Optional[str] = typer.Option(
+        None,
+        "--batch-file",
+        "-b",
+        help="批量任务文件（JSONL），每行包含background/background_file、goal/goal_file和可选的output_dir",
+    ),
+    output_dir: Optional[str] = typer.Option(
+        None, "--output-dir", "-o", help="输出目录，默认为配置的输出目录下以任务ID命名的子目录"
+    ),
+    queue_url: Optional[str] = typer.Option(
+        None, "--queue", "-q", help="任务队列URL，默认使用配置文件中的值"
+    ),
+    max_attempts: Optional[int] = typer.Option(
+        None, "--max-attempts", help="最大执行次数，默认使用配置文件中的值"
+    ),
+    deadline: Optional[float] = typer.Option(
+        None, "--deadline", help="每个任务的时间预算（秒），从worker开始执行时计时，默认使用配置文件中的值"
+    ),
+):
+    """将学习计划生成任务加入任务队列，由worker执行"""
+    try:
+        if batch_file:
+            payloads = _load_batch_payloads(batch_file)
+            logger.info(f"从批量任务文件读取 {len(payloads)} 个任务: {batch_file}")
+        else:
+            # 入队时读取文件内容，worker无需访问这些文件
+            payloads = [{
+                "user_background": _read_text(background_file),
+                "user_goal": _read_text(goal_file),
+                "output_dir": output_dir,
+            }]
+
+        queue = create_job_queue(queue_url)
+        for payload in payloads:
+            if payload.get("deadline_seconds") is None:
+                payload["deadline_seconds"] = deadline
+            job_id = queue.enqueue(payload, max_attempts)
+            typer.echo(f"📥 任务已入队: {job_id}")
+
+    except FileNotFoundError as e:
+        logger.error(f"文件未找到: {e}")
+        typer.echo(f"❌ 文件未找到: {e}", err=True)
+        raise typer.Exit(code=1)
+    except Exception as e:
+        logger.error(f"任务入队时出错: {e}")
+        typer.echo(f"❌ 任务入队时出错: {e}", err=True)
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def worker(
+    queue_url: Optional[str] = typer.Option(
+        None, "--queue", "-q", help="任务队列URL，默认使用配置文件中的值"
+    ),
+    worker_id: Optional[str] = typer.Option(
+        None, "--worker-id", help="worker标识，默认由主机名和进程号生成"
+    ),
+    concurrency: int = typer.Option(
+        1, "--concurrency", "-c", help="本进程内并发执行的任务数"
+    ),
+    max_jobs: Optional[int] = typer.Option(
+        None, "--max-jobs", help="每个并发槽位最多执行的任务数，默认不限"
+    ),
+    exit_when_empty: bool = typer.Option(
+        False, "--exit-when-empty", help="队列为空时退出"
+    ),
+    profile: bool = typer.Option(
+        False, "--profile", help="采样分析每个任务的本地计算开销，结果写入任务输出目录下的profile/"
+    ),
+    verbose: bool = typer.Option(False, "--verbose", "-v", help="启用详细日志输出"),
+):
+    """从任务队列中领取并执行学习计划生成任务"""
+    import threading
+    from .worker import Worker
+
+    if verbose:
+        logging.getLogger().setLevel(logging.DEBUG)
+
+    if profile and concurrency > 1:
+        typer.echo("⚠️ 并发执行多个任务时，各任务的性能分析样本会混在一起，建议使用 --concurrency 1")
+
+    queue = create_job_queue(queue_url)
+    workers = [
+        Worker(queue, f"{worker_id}-{i}" if worker_id and concurrency > 1 else worker_id, profile=profile)
+        for i in range(concurrency)
+    ]
+    threads = [
+        threading.Thread(
+            target=w.run, args=(max_jobs, exit_when_empty), name=w.worker_id, daemon=True
+        )
+        for w in workers
+    ]
+    typer.echo(f"👷 启动 {concurrency} 个worker: {', '.join(w.worker_id for w in workers)}")
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            # 带超时的join，保证可以响应Ctrl+C
+            while thread.is_alive():
+                thread.join(timeout=1)
+    except KeyboardInterrupt:
+        typer.echo("⏹️  正在停止，等待当前任务完成...")
+        for w in workers:
+            w.stop()
+        for thread in threads:
+            thread.join()
+
+
+@app.command()
+def jobs(
+    job_id: Optional[str] = typer.Argument(None, help="任务ID，不指定时列出最近的任务"),
+    status: Optional[str] = typer.Option(
+        None, "--status", "-s", help="按状态过滤: pending, running, succeeded, dead"
+    ),
+    limit: int = typer.Option(20, "--limit", "-n", help="最多列出的任务数"),
+    queue_url: Optional[str] = typer.Option(
+        None, "--queue", "-q", help="任务队列URL，默认使用配置文件中的值"
+    ),
+):
+    """查看任务队列中任务的状态"""
+    from datetime import datetime
+
+    queue = create_job_queue(queue_url)
+    if job_id:
+        job = queue.get(job_id)
+        if job is None:
+            typer.echo(f"❌ 任务不存在: {job_id}", err=True)
+            raise typer.Exit(code=1)
+        job_list = [job]
+    else:
+        job_list = queue.list_jobs(status, limit)
+
+    for job in job_list:
+        updated_at = datetime.fromtimestamp(job.updated_at).strftime("%Y-%m-%d %H:%M:%S")
+        line = f"{job.id}  {job.status:<9}  attempts {job.attempts}/{job.max_attempts}  {updated_at}"
+        if job.lease_owner:
+            line += f"  worker {job.lease_owner}"
+        if job.result:
+            line += f"  output {job.result.get('output_dir')}"
+        if job.error:
+            line += f"  error {job.error}"
+        typer.echo(line)
+
+
 @app.command()
 def version():
     """显示当前版本"""
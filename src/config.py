@@ -1,3 +1,4 @@
+from typing import Dict, Optional
 from pydantic_settings import BaseSettings
 
 
@@ -8,6 +9,20 @@ class Settings(BaseSettings):
     model_name: str = "deepseek-chat"
     api_key: str
     deepseek_api_base: str
+    # 平台专属API密钥，未配置时使用API_KEY
+    deepseek_api_key: Optional[str] = None
+    google_api_key: Optional[str] = None
+    # 按节点单独配置模型，JSON格式，值为"平台:模型"或"模型"，
+    # 如{"critique_plan": "deepseek:deepseek-chat", "compare_plans": "deepseek:deepseek-reasoner"}
+    node_models: Dict[str, str] = {}
+    # 进程内并发的相同（模型、参数、prompt）调用只请求一次，结果分发给所有等待者
+    model_single_flight: bool = True
+    
+    # 计划审查与对比配置
+    critique_candidates: int = 3  # 修正计划数量，最多26份
+    compare_mode: str = "single"  # 可选值: single（一次对比全部修正计划）, tournament（分组淘汰赛）
+    compare_group_size: int = 3  # 淘汰赛每组对比的修正计划数量，至少2份
+    compare_top_candidates: int = 2  # 淘汰赛晋级到最终计划的修正计划数量
     
     # 日志配置
     log_level: str = "INFO"
@@ -16,6 +31,36 @@ class Settings(BaseSettings):
     
     # 输出配置
     output_dir: str = "plans"
+    plan_repair_max_rounds: int = 2  # 计划JSON未通过校验时，按片段修复的最大轮数
+    
+    # 日计划批量生成配置
+    daily_batch_mode: bool = False  # 是否把多个双周合并到一次日计划调用中
+    daily_batch_output_tokens: int = 8000  # 每次批量调用的最大输出token数，超过模型上限时按上限调用
+    daily_period_output_tokens: int = 4000  # 单个双周日计划输出token数的初始估计，运行中按实际用量调整
+    
+    # 运行截止时间与降级配置
+    run_deadline_seconds: Optional[float] = None  # 单次运行的时间预算（秒），为空表示不限制
+    # 以下阈值为剩余时间占时间预算的比例，随预算缩放
+    degrade_critique_below_fraction: Optional[float] = 0.5  # 剩余时间少于该比例时减少修正计划数量
+    degrade_min_candidates: int = 1  # 降级时生成的修正计划数量
+    degrade_skip_compare_below_fraction: Optional[float] = 0.3  # 剩余时间少于该比例时跳过计划对比
+    degrade_skip_daily_below_fraction: Optional[float] = 0.05  # 剩余时间少于该比例时不再生成日计划，留待之后补全
+    
+    # 性能分析配置
+    profile_interval_ms: float = 5  # --profile采样间隔（毫秒）
+    
+    # 大文本存储配置
+    artifact_dir: str = ".artifacts"  # 内存缓存超限时的落盘目录
+    artifact_cache_mb: int = 64  # 内存缓存上限（MB）
+    artifact_ttl_hours: float = 24  # 落盘文本超过该时长未被访问时删除
+    
+    # 任务队列配置
+    queue_url: str = "sqlite:///queue/jobs.db"  # 可选值: sqlite:///<path>，或已注册的其他后端
+    job_max_attempts: int = 3  # 每个任务的最大执行次数，超过后进入死信
+    job_lease_seconds: float = 300  # 任务租约时长，worker崩溃后租约过期即可被重新领取
+    job_heartbeat_seconds: float = 30  # worker续租间隔
+    job_retry_backoff_seconds: float = 30  # 失败重试的初始退避时间，之后按指数增长
+    worker_poll_seconds: float = 5  # 队列为空时worker的轮询间隔
     
     class Config:
         env_file = ".env"
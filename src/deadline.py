@@ -0,0 +1,61 @@
+from typing import Optional
+import threading
+import time
+
+
+class DeadlineExceeded(TimeoutError):
+    """运行超过了截止时间"""
+
+
+class Deadline:
+    """一次运行的截止时间，传递给该运行的所有模型调用"""
+
+    def __init__(self, seconds: Optional[float] = None, cancel_event: Optional[threading.Event] = None):
+        """初始化Deadline
+
+        Args:
+            seconds: 从现在起的时间预算（秒），为空表示不限制
+            cancel_event: 设置后立即视为超时，用于从外部停止运行
+        """
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds if seconds is not None else None
+        self.cancel_event = cancel_event
+
+    @property
+    def cancelled(self) -> bool:
+        """运行是否已被外部取消"""
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+    def remaining(self) -> Optional[float]:
+        """剩余时间（秒），不限制时返回None，已取消时返回0"""
+        if self.cancelled:
+            return 0.0
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        """是否已超过截止时间"""
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def below(self, seconds: Optional[float]) -> bool:
+        """剩余时间是否少于给定秒数，不限制时总是False"""
+        remaining = self.remaining()
+        return remaining is not None and seconds is not None and remaining < seconds
+
+    def below_fraction(self, fraction: Optional[float]) -> bool:
+        """剩余时间是否少于时间预算的给定比例，不限制时总是False"""
+        return self.seconds is not None and fraction is not None and self.below(self.seconds * fraction)
+
+    def check(self, what: str = "run") -> None:
+        """已超过截止时间时抛出DeadlineExceeded
+
+        Raises:
+            DeadlineExceeded: 已超过截止时间
+        """
+        if self.cancelled:
+            raise DeadlineExceeded(f"Run cancelled before {what}")
+        if self.expired:
+            raise DeadlineExceeded(f"Deadline of {self.seconds}s exceeded before {what}")
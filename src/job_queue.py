@@ -0,0 +1,303 @@
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from pydantic import BaseModel
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# worker执行任务期间续租线程的名称前缀
+HEARTBEAT_THREAD_PREFIX = "heartbeat-"
+
+
+class JobStatus:
+    """任务状态"""
+    PENDING = "pending"  # 等待执行（包括等待重试）
+    RUNNING = "running"  # 已被某个worker租用
+    SUCCEEDED = "succeeded"  # 执行成功
+    DEAD = "dead"  # 重试次数耗尽，进入死信
+
+
+class Job(BaseModel):
+    """队列中的任务"""
+    id: str
+    payload: Dict[str, Any]
+    status: str
+    attempts: int = 0
+    max_attempts: int
+    lease_owner: Optional[str] = None
+    lease_expires_at: Optional[float] = None
+    available_at: float
+    error: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+    created_at: float
+    updated_at: float
+
+
+class JobQueue(ABC):
+    """持久化任务队列接口
+
+    worker通过claim租用任务，并在执行期间定期heartbeat续租。
+    租约过期（worker崩溃）的任务会被其他worker重新领取，
+    失败的任务按指数退避重试，重试次数耗尽后进入死信状态。
+    """
+
+    @abstractmethod
+    def enqueue(self, payload: Dict[str, Any], max_attempts: Optional[int] = None) -> str:
+        """添加任务，返回任务ID"""
+
+    @abstractmethod
+    def claim(self, worker_id: str, lease_seconds: Optional[float] = None) -> Optional[Job]:
+        """租用一个可执行的任务，没有可执行任务时返回None"""
+
+    @abstractmethod
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: Optional[float] = None) -> bool:
+        """续租任务，租约已被他人接管时返回False"""
+
+    @abstractmethod
+    def complete(self, job_id: str, worker_id: str, result: Dict[str, Any]) -> bool:
+        """标记任务成功，租约已被他人接管时返回False"""
+
+    @abstractmethod
+    def fail(self, job_id: str, worker_id: str, error: str) -> Optional[str]:
+        """标记任务失败，返回任务的新状态（pending表示将重试，dead表示进入死信）"""
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Job]:
+        """查询任务"""
+
+    @abstractmethod
+    def list_jobs(self, status: Optional[str] = None, limit: int = 100) -> List[Job]:
+        """按创建时间倒序列出任务"""
+
+
+class SQLiteJobQueue(JobQueue):
+    """基于SQLite的持久化任务队列
+
+    适用于单机多进程。使用WAL日志模式，WAL依赖共享内存，不能放在NFS等网络文件系统上，
+    多机部署请通过register_queue_backend注册其他后端。
+    每次操作使用独立连接，可在多线程和多进程中安全使用。
+    """
+
+    def __init__(self, path: str):
+        """初始化SQLiteJobQueue
+
+        Args:
+            path: SQLite数据库文件路径
+        """
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL,
+                    lease_owner TEXT,
+                    lease_expires_at REAL,
+                    available_at REAL NOT NULL,
+                    error TEXT,
+                    result TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, available_at)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """打开自动提交模式的连接，用完即关闭"""
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """在写锁事务中执行，保证同一任务只会被一个worker修改"""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def enqueue(self, payload: Dict[str, Any], max_attempts: Optional[int] = None) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, payload, status, max_attempts, available_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job_id,
+                    json.dumps(payload, ensure_ascii=False),
+                    JobStatus.PENDING,
+                    max_attempts or settings.job_max_attempts,
+                    now,
+                    now,
+                    now,
+                ),
+            )
+        logger.info(f"Enqueued job {job_id}")
+        return job_id
+
+    def claim(self, worker_id: str, lease_seconds: Optional[float] = None) -> Optional[Job]:
+        lease_seconds = lease_seconds or settings.job_lease_seconds
+        now = time.time()
+        with self._transaction() as conn:
+            # 租约过期且重试次数已耗尽的任务直接进入死信
+            conn.execute(
+                "UPDATE jobs SET status = ?, lease_owner = NULL, updated_at = ?, "
+                "error = COALESCE(error, 'lease expired') "
+                "WHERE status = ? AND lease_expires_at < ? AND attempts >= max_attempts",
+                (JobStatus.DEAD, now, JobStatus.RUNNING, now),
+            )
+            # 领取可执行的任务，或租约已过期（worker崩溃）的任务
+            row = conn.execute(
+                "SELECT id FROM jobs "
+                "WHERE (status = ? AND available_at <= ?) OR (status = ? AND lease_expires_at < ?) "
+                "ORDER BY created_at LIMIT 1",
+                (JobStatus.PENDING, now, JobStatus.RUNNING, now),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_owner = ?, "
+                "lease_expires_at = ?, updated_at = ? WHERE id = ?",
+                (JobStatus.RUNNING, worker_id, now + lease_seconds, now, row["id"]),
+            )
+        job = self.get(row["id"])
+        logger.info(f"Worker {worker_id} claimed job {job.id} (attempt {job.attempts}/{job.max_attempts})")
+        return job
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: Optional[float] = None) -> bool:
+        lease_seconds = lease_seconds or settings.job_lease_seconds
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires_at = ?, updated_at = ? "
+                "WHERE id = ? AND status = ? AND lease_owner = ?",
+                (now + lease_seconds, now, job_id, JobStatus.RUNNING, worker_id),
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id: str, worker_id: str, result: Dict[str, Any]) -> bool:
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = NULL, lease_owner = NULL, "
+                "lease_expires_at = NULL, updated_at = ? "
+                "WHERE id = ? AND status = ? AND lease_owner = ?",
+                (
+                    JobStatus.SUCCEEDED,
+                    json.dumps(result, ensure_ascii=False),
+                    now,
+                    job_id,
+                    JobStatus.RUNNING,
+                    worker_id,
+                ),
+            )
+        return cursor.rowcount == 1
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> Optional[str]:
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND status = ? AND lease_owner = ?",
+                (job_id, JobStatus.RUNNING, worker_id),
+            ).fetchone()
+            if row is None:
+                return None
+            if row["attempts"] >= row["max_attempts"]:
+                status = JobStatus.DEAD
+                available_at = now
+            else:
+                # 指数退避后重试
+                status = JobStatus.PENDING
+                available_at = now + settings.job_retry_backoff_seconds * 2 ** (row["attempts"] - 1)
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, lease_owner = NULL, lease_expires_at = NULL, "
+                "available_at = ?, updated_at = ? WHERE id = ?",
+                (status, error, available_at, now, job_id),
+            )
+        return status
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_job(row) if row else None
+
+    def list_jobs(self, status: Optional[str] = None, limit: int = 100) -> List[Job]:
+        with self._connect() as conn:
+            if status:
+                rows = conn.execute(
+                    "SELECT * FROM jobs WHERE status = ? ORDER BY created_at DESC LIMIT ?",
+                    (status, limit),
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+                ).fetchall()
+        return [self._to_job(row) for row in rows]
+
+    @staticmethod
+    def _to_job(row: sqlite3.Row) -> Job:
+        data = dict(row)
+        data["payload"] = json.loads(data["payload"])
+        data["result"] = json.loads(data["result"]) if data["result"] else None
+        return Job(**data)
+
+
+# 队列后端注册表：URL scheme -> 根据URL剩余部分创建队列的工厂函数
+QUEUE_BACKENDS: Dict[str, Callable[[str], JobQueue]] = {
+    "sqlite": SQLiteJobQueue,
+}
+
+
+def register_queue_backend(scheme: str, factory: Callable[[str], JobQueue]) -> None:
+    """注册新的队列后端，如register_queue_backend("redis", RedisJobQueue)"""
+    QUEUE_BACKENDS[scheme] = factory
+
+
+def create_job_queue(url: Optional[str] = None) -> JobQueue:
+    """根据队列URL创建任务队列
+
+    Args:
+        url: 队列URL，如"sqlite:///queue/jobs.db"，默认使用配置文件中的值
+
+    Returns:
+        任务队列实例
+    """
+    url = url or settings.queue_url
+    scheme, sep, location = url.partition("://")
+    if not sep:
+        # 没有scheme时按SQLite文件路径处理
+        scheme, location = "sqlite", url
+    elif scheme == "sqlite":
+        # sqlite:///relative/path 与 sqlite:////absolute/path
+        location = location[1:] if location.startswith("/") else location
+    if scheme not in QUEUE_BACKENDS:
+        raise ValueError(
+            f"Unsupported queue backend: {scheme}. Supported backends: {', '.join(QUEUE_BACKENDS)}"
+        )
+    return QUEUE_BACKENDS[scheme](location)
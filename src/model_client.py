@@ -1,13 +1,21 @@
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_deepseek import ChatDeepSeek
-from langchain_core.messages import HumanMessage
-from typing import Optional, Dict, Any
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from typing import Optional, Dict, Any, Awaitable, Callable, Hashable, List, Tuple
+import asyncio
+import functools
+import httpx
 import logging
 import os
 import json
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 from datetime import datetime
 
 from .config import settings
+from .deadline import Deadline, DeadlineExceeded
 
 logger = logging.getLogger(__name__)
 
@@ -35,6 +43,272 @@ model_interaction_logger.addHandler(model_interaction_handler)
 model_interaction_logger.propagate = False
 
 
+SUPPORTED_PLATFORMS = ("deepseek", "google")
+
+# 设置了截止时间的同步调用不使用平台SDK的自动重试（SDK重试时重新计时，可能远超截止时间），
+# 改为在剩余时间内最多重试的次数
+DEADLINE_CALL_RETRIES = 2
+
+# 限流或服务端错误未给出Retry-After时，重试前等待的初始秒数（每次重试翻倍）
+DEADLINE_RETRY_BACKOFF_SECONDS = 1.0
+
+
+def _error_chain(error: BaseException) -> List[BaseException]:
+    """异常及其__cause__链，平台SDK常把底层的HTTP异常包装后重新抛出"""
+    chain = []
+    while error is not None and error not in chain:
+        chain.append(error)
+        error = error.__cause__
+    return chain
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    """异常对应的HTTP状态码（DeepSeek为status_code，Google为code），没有时返回None"""
+    for e in _error_chain(error):
+        for attr in ("status_code", "code"):
+            code = getattr(e, attr, None)
+            if isinstance(code, int):
+                return code
+    return None
+
+
+def _is_transient_error(error: BaseException) -> bool:
+    """是否为重试可能成功的错误：超时、连接错误、限流（429）和服务端错误（5xx）
+
+    参数错误、认证失败、无权限等（400/401/403/404）重试也不会成功。
+    """
+    status = _status_code(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    return any(
+        isinstance(e, (TimeoutError, ConnectionError, httpx.TransportError)) for e in _error_chain(error)
+    )
+
+
+def _retry_after_seconds(error: BaseException) -> Optional[float]:
+    """响应头中Retry-After给出的等待秒数，没有或无法解析时返回None"""
+    for e in _error_chain(error):
+        headers = getattr(getattr(e, "response", None), "headers", None)
+        value = headers.get("retry-after") if headers is not None else None
+        if value is None:
+            continue
+        try:
+            return max(0.0, float(value))
+        except (TypeError, ValueError):
+            return None
+    return None
+
+# 已知模型的最大输出token数，请求的max_tokens超过时平台会拒绝请求；未列出的模型不做限制
+MODEL_MAX_OUTPUT_TOKENS = {
+    "deepseek-chat": 8192,
+    "deepseek-reasoner": 65536,
+    "gemini-2.0-flash": 8192,
+    "gemini-2.5-flash": 65536,
+    "gemini-2.5-pro": 65536,
+}
+
+# 表示输出被截断的结束原因（DeepSeek为length，Google为MAX_TOKENS）
+TRUNCATED_FINISH_REASONS = {"length", "max_tokens"}
+
+# 支持单独配置模型的工作流节点
+ROUTED_NODES = (
+    "generate_initial_plan",
+    "critique_plan",
+    "compare_plans",
+    "generate_final_plan",
+    "generate_daily_plans",
+)
+
+
+class ModelMetrics:
+    """记录单个模型客户端的调用指标（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.prompt_chars = 0
+        self.response_chars = 0
+        self.coalesced = 0
+
+    def record(
+        self,
+        latency: float,
+        prompt_chars: int,
+        response_chars: int = 0,
+        error: bool = False,
+        coalesced: bool = False,
+    ) -> None:
+        """记录一次调用，coalesced表示复用了其他进行中的相同调用的结果"""
+        with self._lock:
+            self.calls += 1
+            self.errors += int(error)
+            self.coalesced += int(coalesced)
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+            self.prompt_chars += prompt_chars
+            self.response_chars += response_chars
+
+    def to_dict(self) -> Dict[str, Any]:
+        """导出为字典"""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "errors": self.errors,
+                "total_latency_seconds": round(self.total_latency, 3),
+                "avg_latency_seconds": round(self.total_latency / self.calls, 3) if self.calls else 0.0,
+                "max_latency_seconds": round(self.max_latency, 3),
+                "prompt_chars": self.prompt_chars,
+                "response_chars": self.response_chars,
+                "coalesced_calls": self.coalesced,
+                "coalescing_rate": round(self.coalesced / self.calls, 3) if self.calls else 0.0,
+            }
+
+
+class SingleFlight:
+    """把并发的相同请求合并为一次调用，结果分发给所有等待者（线程安全）
+
+    第一个请求（leader）执行调用，期间到达的相同请求只等待其结果；
+    调用完成后即移除，之后的相同请求会重新调用，不做结果缓存。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any], timeout: Optional[float] = None) -> Tuple[Any, bool]:
+        """执行调用，已有相同的调用在进行中时等待其结果
+
+        Args:
+            key: 请求标识，相同标识的请求会被合并
+            fn: 执行调用的函数
+            timeout: 等待其他调用结果的最长时间（秒），为空表示一直等待
+
+        Returns:
+            (调用结果, 是否复用了其他调用的结果)
+
+        Raises:
+            concurrent.futures.TimeoutError: 等待其他调用的结果超时
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+
+        if not leader:
+            return future.result(timeout=timeout), True
+
+        try:
+            result = fn()
+            future.set_result(result)
+            return result, False
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+
+class AsyncSingleFlight:
+    """SingleFlight的asyncio版本，合并同一事件循环内并发的相同请求"""
+
+    def __init__(self):
+        # 不同线程中的事件循环共享同一个字典
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(
+        self, key: Hashable, fn: Callable[[], Awaitable[Any]], timeout: Optional[float] = None
+    ) -> Tuple[Any, bool]:
+        """执行调用，已有相同的调用在进行中时等待其结果
+
+        Args:
+            key: 请求标识，相同标识的请求会被合并
+            fn: 返回协程的调用函数
+            timeout: 等待其他调用结果的最长时间（秒），为空表示一直等待
+
+        Returns:
+            (调用结果, 是否复用了其他调用的结果)
+
+        Raises:
+            asyncio.TimeoutError: 等待其他调用的结果超时
+        """
+        loop = asyncio.get_running_loop()
+        key = (id(loop), key)
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = loop.create_future()
+                self._calls[key] = future
+
+        if not leader:
+            # 等待者被取消时不影响leader的调用
+            return await asyncio.wait_for(asyncio.shield(future), timeout), True
+
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result, False
+        except asyncio.CancelledError:
+            # leader被取消时让等待者按截止时间决定是否重新调用
+            future.set_exception(DeadlineExceeded("Coalesced model call was cancelled"))
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 没有等待者时避免"exception was never retrieved"警告
+            future.exception()
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+
+# 进程内所有ModelClient共享，使并发运行的相同调用只请求一次
+_single_flight = SingleFlight()
+_async_single_flight = AsyncSingleFlight()
+
+
+@functools.lru_cache(maxsize=None)
+def _create_chat_model(
+    platform: str, model_name: str, api_key: str, max_retries: Optional[int] = None
+) -> BaseChatModel:
+    """根据平台配置创建底层聊天模型客户端，max_retries为空时使用平台SDK的默认重试次数"""
+    retry_kwargs = {"max_retries": max_retries} if max_retries is not None else {}
+    if platform == "deepseek":
+        # 初始化DeepSeek客户端
+        logger.info(f"Initializing DeepSeek client for model {model_name}")
+        return ChatDeepSeek(
+            model=model_name,
+            api_key=api_key,
+            api_base=settings.deepseek_api_base,
+            temperature=0.7,
+            max_tokens=None,
+            timeout=None,
+            **retry_kwargs,
+        )
+    if platform == "google":
+        # 初始化Google Generative AI客户端
+        logger.info(f"Initializing Google Generative AI client for model {model_name}")
+        return ChatGoogleGenerativeAI(
+            model=model_name,
+            api_key=api_key,
+            temperature=0.7,
+            max_tokens=None,
+            timeout=None,
+            **retry_kwargs,
+        )
+    raise ValueError(
+        f"Unsupported platform: {platform}. Supported platforms: {', '.join(SUPPORTED_PLATFORMS)}"
+    )
+
+
 class ModelClient:
     """大模型客户端类，用于调用大模型API"""
 
@@ -53,78 +327,303 @@ class ModelClient:
         """
         self.platform = platform or settings.platform
         self.model_name = model_name or settings.model_name
-        self.api_key = api_key or settings.api_key
-
-        # 根据平台配置选择不同的客户端
-        if self.platform == "deepseek":
-            # 初始化DeepSeek客户端
-            logger.info(f"Initializing DeepSeek client for model {self.model_name}")
-            self.client = ChatDeepSeek(
-                model=self.model_name,
-                api_key=self.api_key,
-                api_base=settings.deepseek_api_base,
-                temperature=0.7,
-                max_tokens=None,
-                timeout=None,
-            )
-        elif self.platform == "google":
-            # 初始化Google Generative AI客户端
-            logger.info(
-                f"Initializing Google Generative AI client for model {self.model_name}"
-            )
-            self.client = ChatGoogleGenerativeAI(
-                model=self.model_name,
-                api_key=self.api_key,
-                temperature=0.7,
-                max_tokens=None,
-                timeout=None,
-            )
-        else:
-            raise ValueError(
-                f"Unsupported platform: {self.platform}. Supported platforms: deepseek, google"
-            )
+        # 优先使用平台专属的API密钥，便于不同节点路由到不同平台
+        self.api_key = api_key or getattr(settings, f"{self.platform}_api_key", None) or settings.api_key
+        self.metrics = ModelMetrics()
+        # 所属运行的截止时间，由ModelRouter设置
+        self.deadline: Optional[Deadline] = None
+
+        # 底层客户端按平台、模型和密钥在进程内共享，避免每次运行都重新建立连接池和SSL上下文
+        self.client = _create_chat_model(self.platform, self.model_name, self.api_key)
+        # 设置了截止时间的同步调用使用不自动重试的客户端，由_invoke在剩余时间内重试
+        self.deadline_client = _create_chat_model(self.platform, self.model_name, self.api_key, max_retries=0)
+
+    @property
+    def route(self) -> str:
+        """路由名称，如deepseek:deepseek-chat"""
+        return f"{self.platform}:{self.model_name}"
 
-    def generate(self, prompt: str, **kwargs) -> str:
+    def generate(
+        self, prompt: str, max_tokens: Optional[int] = None, coalesce: bool = True, **kwargs
+    ) -> str:
         """调用大模型生成文本
 
         Args:
             prompt: 输入的prompt
-            **kwargs: 额外的参数
+            max_tokens: 本次调用的最大输出token数，默认不限制
+            coalesce: 是否与进行中的相同调用合并，需要多次独立采样时应设为False
+            **kwargs: 额外的参数，透传给底层模型的invoke
 
         Returns:
             大模型生成的文本
         """
-        try:
-            logger.info(
-                f"Calling model {self.model_name} with prompt (first 200 chars): {prompt[:200]}..."
-            )
-            logger.debug(f"Full prompt: {prompt}")
+        return self.generate_message(prompt, max_tokens, coalesce, **kwargs).content
 
-            # 记录完整的模型交互
-            interaction_id = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-            model_interaction_logger.info(f"=== Interaction {interaction_id} Start ===")
-            model_interaction_logger.info(f"Model: {self.model_name}")
-            model_interaction_logger.info(f"Prompt:\n{prompt}")
+    def generate_message(
+        self, prompt: str, max_tokens: Optional[int] = None, coalesce: bool = True, **kwargs
+    ) -> AIMessage:
+        """调用大模型，返回包含元数据（结束原因、token用量）的完整消息
+
+        Args:
+            prompt: 输入的prompt
+            max_tokens: 本次调用的最大输出token数，默认不限制
+            coalesce: 是否与进行中的相同调用合并，需要多次独立采样时应设为False
+            **kwargs: 额外的参数，透传给底层模型的invoke
+
+        Returns:
+            大模型返回的消息
+        """
+        start_time = time.perf_counter()
+        try:
+            interaction_id = self._log_request(prompt)
 
             # 调用大模型
             messages = [HumanMessage(content=prompt)]
-            response = self.client.invoke(messages)
+            invoke_kwargs = {**self._invoke_kwargs(max_tokens), **kwargs}
+            if coalesce and settings.model_single_flight:
+                response, coalesced = self._invoke_coalesced(prompt, messages, invoke_kwargs)
+            else:
+                response, coalesced = self._invoke(messages, **invoke_kwargs), False
 
-            logger.info(
-                f"Model {self.model_name} returned response (first 200 chars): {response.content[:200]}..."
+            self._log_response(interaction_id, response, coalesced)
+            self.metrics.record(
+                time.perf_counter() - start_time, len(prompt), len(response.content), coalesced=coalesced
             )
-            logger.debug(f"Full response: {response.content}")
+            return response
+        except Exception as e:
+            self.metrics.record(time.perf_counter() - start_time, len(prompt), error=True)
+            logger.error(f"Error calling model {self.model_name}: {e}")
+            logger.exception("Full error traceback:")
+            raise
 
-            # 记录完整的响应
-            model_interaction_logger.info(f"Response:\n{response.content}")
-            model_interaction_logger.info(f"=== Interaction {interaction_id} End ===\n")
+    async def agenerate(
+        self, prompt: str, max_tokens: Optional[int] = None, coalesce: bool = True, **kwargs
+    ) -> str:
+        """generate的异步版本，基于底层模型的ainvoke，不占用线程"""
+        return (await self.agenerate_message(prompt, max_tokens, coalesce, **kwargs)).content
+
+    async def agenerate_message(
+        self, prompt: str, max_tokens: Optional[int] = None, coalesce: bool = True, **kwargs
+    ) -> AIMessage:
+        """generate_message的异步版本，基于底层模型的ainvoke，不占用线程"""
+        start_time = time.perf_counter()
+        try:
+            interaction_id = self._log_request(prompt)
 
-            return response.content
+            # 调用大模型
+            messages = [HumanMessage(content=prompt)]
+            invoke_kwargs = {**self._invoke_kwargs(max_tokens), **kwargs}
+            if coalesce and settings.model_single_flight:
+                response, coalesced = await self._ainvoke_coalesced(prompt, messages, invoke_kwargs)
+            else:
+                response, coalesced = await self._ainvoke(messages, **invoke_kwargs), False
+
+            self._log_response(interaction_id, response, coalesced)
+            self.metrics.record(
+                time.perf_counter() - start_time, len(prompt), len(response.content), coalesced=coalesced
+            )
+            return response
         except Exception as e:
+            self.metrics.record(time.perf_counter() - start_time, len(prompt), error=True)
             logger.error(f"Error calling model {self.model_name}: {e}")
             logger.exception("Full error traceback:")
             raise
 
+    def _log_request(self, prompt: str) -> str:
+        """记录模型调用的prompt，返回交互ID"""
+        logger.info(
+            f"Calling model {self.model_name} with prompt (first 200 chars): {prompt[:200]}..."
+        )
+        logger.debug(f"Full prompt: {prompt}")
+
+        # 记录完整的模型交互
+        interaction_id = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        model_interaction_logger.info(f"=== Interaction {interaction_id} Start ===")
+        model_interaction_logger.info(f"Model: {self.model_name}")
+        model_interaction_logger.info(f"Prompt:\n{prompt}")
+        return interaction_id
+
+    def _log_response(self, interaction_id: str, response: AIMessage, coalesced: bool) -> None:
+        """记录模型返回的响应"""
+        if coalesced:
+            logger.info(f"Model {self.model_name} call coalesced with an identical in-flight call")
+        logger.info(
+            f"Model {self.model_name} returned response (first 200 chars): {response.content[:200]}..."
+        )
+        logger.debug(f"Full response: {response.content}")
+
+        # 记录完整的响应
+        model_interaction_logger.info(f"Response:\n{response.content}")
+        model_interaction_logger.info(f"=== Interaction {interaction_id} End ===\n")
+
+    def _coalesce_key(self, prompt: str, kwargs: Dict[str, Any]) -> Tuple[str, str, str]:
+        """合并请求的键：路由、调用参数和prompt"""
+        return (self.route, json.dumps(kwargs, sort_keys=True, default=str), prompt)
+
+    def _invoke_coalesced(
+        self, prompt: str, messages: List[HumanMessage], kwargs: Dict[str, Any]
+    ) -> Tuple[AIMessage, bool]:
+        """与进行中的相同（模型、参数、prompt）调用合并
+
+        Returns:
+            (模型返回的消息, 是否复用了其他调用的结果)
+
+        Raises:
+            DeadlineExceeded: 等待其他调用的结果时超过了本运行的截止时间
+        """
+        key = self._coalesce_key(prompt, kwargs)
+        # 记录本运行是否作为leader发起过调用，自己的调用超时不再重试
+        own_calls = []
+
+        def invoke() -> AIMessage:
+            own_calls.append(True)
+            return self._invoke(messages, **kwargs)
+
+        while True:
+            timeout = self.deadline.remaining() if self.deadline is not None else None
+            try:
+                return _single_flight.do(key, invoke, timeout)
+            # DeadlineExceeded是TimeoutError的子类，需先于等待超时处理
+            except DeadlineExceeded:
+                # leader所属运行的截止时间到了，本运行还有时间时重新发起调用
+                if own_calls or (self.deadline is not None and self.deadline.expired):
+                    raise
+                logger.info(f"Coalesced model {self.model_name} call was cancelled by its leader, retrying")
+            except FutureTimeoutError as e:
+                raise DeadlineExceeded(
+                    f"Model {self.model_name} call cancelled, deadline of {self.deadline.seconds}s exceeded"
+                ) from e
+
+    def _invoke(self, messages: List[HumanMessage], **kwargs) -> AIMessage:
+        """调用底层模型，设置了截止时间时按剩余时间限制本次调用
+
+        在调用方线程中执行。每次请求的HTTP超时设为当前剩余时间，到期后由HTTP客户端中断请求；
+        超时、连接错误、限流和服务端错误在仍有剩余时间时最多重试DEADLINE_CALL_RETRIES次，
+        限流和服务端错误按Retry-After（没有时按退避时间）等待后重试，其他错误直接抛出。
+
+        Raises:
+            DeadlineExceeded: 调用前已超时，或调用未能在截止时间前完成
+        """
+        if self.deadline is None or self.deadline.remaining() is None:
+            return self.client.invoke(messages, **kwargs)
+
+        attempt = 0
+        while True:
+            self.deadline.check(f"calling model {self.model_name}")
+            # Google按毫秒取整，避免超时被取整为0
+            timeout = max(self.deadline.remaining(), 0.001)
+            try:
+                return self.deadline_client.invoke(messages, **{**kwargs, "timeout": timeout})
+            except Exception as e:
+                if self.deadline.expired:
+                    raise DeadlineExceeded(
+                        f"Model {self.model_name} call timed out, deadline of {self.deadline.seconds}s exceeded"
+                    ) from e
+                if attempt >= DEADLINE_CALL_RETRIES or not _is_transient_error(e):
+                    raise
+                attempt += 1
+                wait = self._retry_wait(e, attempt)
+                if wait >= self.deadline.remaining():
+                    logger.warning(f"Model {self.model_name} call failed: {e}, no time left to wait {wait:.1f}s for retry")
+                    raise
+                logger.warning(
+                    f"Model {self.model_name} call failed: {e}, retrying in {wait:.1f}s ({attempt}/{DEADLINE_CALL_RETRIES})"
+                )
+                self._sleep(wait)
+
+    @staticmethod
+    def _retry_wait(error: Exception, attempt: int) -> float:
+        """重试前的等待秒数：超时和连接错误立即重试，限流和服务端错误优先使用Retry-After"""
+        if _status_code(error) is None:
+            return 0.0
+        retry_after = _retry_after_seconds(error)
+        if retry_after is not None:
+            return retry_after
+        return DEADLINE_RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1)
+
+    def _sleep(self, seconds: float) -> None:
+        """等待重试，运行被取消时提前结束"""
+        if seconds <= 0:
+            return
+        if self.deadline.cancel_event is not None:
+            self.deadline.cancel_event.wait(seconds)
+        else:
+            time.sleep(seconds)
+
+    async def _ainvoke_coalesced(
+        self, prompt: str, messages: List[HumanMessage], kwargs: Dict[str, Any]
+    ) -> Tuple[AIMessage, bool]:
+        """_invoke_coalesced的异步版本"""
+        key = self._coalesce_key(prompt, kwargs)
+        # 记录本运行是否作为leader发起过调用，自己的调用超时不再重试
+        own_calls = []
+
+        async def ainvoke() -> AIMessage:
+            own_calls.append(True)
+            return await self._ainvoke(messages, **kwargs)
+
+        while True:
+            timeout = self.deadline.remaining() if self.deadline is not None else None
+            try:
+                return await _async_single_flight.do(key, ainvoke, timeout)
+            # DeadlineExceeded是TimeoutError的子类，需先于等待超时处理
+            except DeadlineExceeded:
+                # leader所属运行的截止时间到了，本运行还有时间时重新发起调用
+                if own_calls or (self.deadline is not None and self.deadline.expired):
+                    raise
+                logger.info(f"Coalesced model {self.model_name} call was cancelled by its leader, retrying")
+            except asyncio.TimeoutError as e:
+                raise DeadlineExceeded(
+                    f"Model {self.model_name} call cancelled, deadline of {self.deadline.seconds}s exceeded"
+                ) from e
+
+    async def _ainvoke(self, messages: List[HumanMessage], **kwargs) -> AIMessage:
+        """_invoke的异步版本，超过截止时间时取消进行中的请求（包括平台SDK的自动重试）
+
+        Raises:
+            DeadlineExceeded: 调用前已超时，或调用未能在截止时间前完成
+        """
+        if self.deadline is None or self.deadline.remaining() is None:
+            return await self.client.ainvoke(messages, **kwargs)
+
+        self.deadline.check(f"calling model {self.model_name}")
+        try:
+            return await asyncio.wait_for(
+                self.client.ainvoke(messages, **kwargs), self.deadline.remaining()
+            )
+        except asyncio.TimeoutError as e:
+            raise DeadlineExceeded(
+                f"Model {self.model_name} call cancelled, deadline of {self.deadline.seconds}s exceeded"
+            ) from e
+
+    def limit_output_tokens(self, max_tokens: int) -> int:
+        """把输出token数限制在本路由的模型允许的范围内"""
+        limit = MODEL_MAX_OUTPUT_TOKENS.get(self.model_name)
+        if limit is None or max_tokens <= limit:
+            return max_tokens
+        logger.info(f"Limiting output tokens from {max_tokens} to {limit} for model {self.model_name}")
+        return limit
+
+    def _invoke_kwargs(self, max_tokens: Optional[int]) -> Dict[str, Any]:
+        """按平台转换单次调用的最大输出token数参数"""
+        if max_tokens is None:
+            return {}
+        if self.platform == "google":
+            return {"generation_config": {"max_output_tokens": max_tokens}}
+        return {"max_tokens": max_tokens}
+
+    @staticmethod
+    def is_truncated(message: AIMessage) -> bool:
+        """模型输出是否因达到最大输出token数而被截断"""
+        finish_reason = (message.response_metadata or {}).get("finish_reason")
+        return str(finish_reason).lower() in TRUNCATED_FINISH_REASONS
+
+    @staticmethod
+    def output_tokens(message: AIMessage) -> Optional[int]:
+        """模型输出的token数，平台未返回用量时为None"""
+        usage = getattr(message, "usage_metadata", None) or {}
+        return usage.get("output_tokens")
+
     def generate_json(self, prompt: str, **kwargs) -> Dict[str, Any]:
         """调用大模型生成JSON格式的文本
 
@@ -135,13 +634,23 @@ class ModelClient:
         Returns:
             解析后的JSON数据
         """
+        logger.info(f"Generating JSON response with model {self.model_name}")
+        response = self.generate(self._json_prompt(prompt), **kwargs)
+        return self._parse_json_response(response)
 
-        # 在prompt末尾添加要求输出JSON格式的指令
-        json_prompt = f"{prompt}\n\n请严格按照JSON格式输出，不要包含任何其他文本。"
-
+    async def agenerate_json(self, prompt: str, **kwargs) -> Dict[str, Any]:
+        """generate_json的异步版本"""
         logger.info(f"Generating JSON response with model {self.model_name}")
-        response = self.generate(json_prompt, **kwargs)
+        response = await self.agenerate(self._json_prompt(prompt), **kwargs)
+        return self._parse_json_response(response)
+
+    @staticmethod
+    def _json_prompt(prompt: str) -> str:
+        """在prompt末尾添加要求输出JSON格式的指令"""
+        return f"{prompt}\n\n请严格按照JSON格式输出，不要包含任何其他文本。"
 
+    def _parse_json_response(self, response: str) -> Dict[str, Any]:
+        """解析模型输出的JSON"""
         try:
             json_data = json.loads(response)
             logger.info(
@@ -158,3 +667,78 @@ class ModelClient:
             logger.error(f"Raw response that failed to parse: {response}")
             logger.exception("Full error traceback:")
             raise
+
+
+def parse_model_spec(spec: str) -> Tuple[str, str]:
+    """解析模型配置，格式为"平台:模型"或"模型"（使用默认平台）
+
+    Returns:
+        (平台, 模型名称)
+    """
+    platform, sep, model_name = spec.strip().partition(":")
+    if not sep:
+        platform, model_name = settings.platform, platform
+    if platform not in SUPPORTED_PLATFORMS or not model_name:
+        raise ValueError(
+            f"Invalid model spec: {spec!r}, expected 'platform:model' with platform in {', '.join(SUPPORTED_PLATFORMS)}"
+        )
+    return platform, model_name
+
+
+class ModelRouter:
+    """按工作流节点路由到不同模型的客户端集合
+
+    未单独配置的节点使用默认的平台和模型。每个不同的"平台:模型"组合
+    使用独立的ModelClient实例，并分别统计调用指标。
+    """
+
+    def __init__(
+        self,
+        node_models: Optional[Dict[str, str]] = None,
+        deadline: Optional[Deadline] = None,
+    ):
+        """初始化ModelRouter
+
+        Args:
+            node_models: 节点名称到模型配置的映射，如{"compare_plans": "deepseek:deepseek-reasoner"}，
+                会覆盖配置文件中NODE_MODELS的同名项
+            deadline: 运行的截止时间，传递给所有客户端的模型调用
+        """
+        self.deadline = deadline
+        self.node_models = {**settings.node_models, **(node_models or {})}
+        unknown_nodes = set(self.node_models) - set(ROUTED_NODES)
+        if unknown_nodes:
+            raise ValueError(
+                f"Unknown nodes in model routing: {', '.join(sorted(unknown_nodes))}. "
+                f"Supported nodes: {', '.join(ROUTED_NODES)}"
+            )
+        self.routes = {
+            node: parse_model_spec(spec) for node, spec in self.node_models.items()
+        }
+        self._clients: Dict[Tuple[str, str], ModelClient] = {}
+        self._lock = threading.Lock()
+        for node, (platform, model_name) in self.routes.items():
+            logger.info(f"Routing node {node} to {platform}:{model_name}")
+
+    def client_for(self, node: str) -> ModelClient:
+        """获取指定节点使用的模型客户端"""
+        route = self.routes.get(node, (settings.platform, settings.model_name))
+        with self._lock:
+            if route not in self._clients:
+                client = ModelClient(*route)
+                client.deadline = self.deadline
+                self._clients[route] = client
+            return self._clients[route]
+
+    def metrics_summary(self) -> Dict[str, Dict[str, Any]]:
+        """按路由汇总调用指标"""
+        summary = {}
+        with self._lock:
+            clients = list(self._clients.items())
+        for route, client in clients:
+            nodes: List[str] = [
+                node for node in ROUTED_NODES
+                if self.routes.get(node, (settings.platform, settings.model_name)) == route
+            ]
+            summary[client.route] = {"nodes": nodes, **client.metrics.to_dict()}
+        return summary
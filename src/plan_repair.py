@@ -0,0 +1,287 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Generator, List, Optional, Tuple, Type, TypeVar, Union
+from pydantic import BaseModel, ValidationError
+import asyncio
+import json
+import logging
+
+from .config import settings
+from .deadline import DeadlineExceeded
+from .model_client import ModelClient
+from .prompt_manager import PromptManager
+
+logger = logging.getLogger(__name__)
+
+PlanT = TypeVar("PlanT", bound=BaseModel)
+
+# JSON文档中的路径，如("milestones", 2)
+FragmentPath = Tuple[Union[str, int], ...]
+
+
+class PlanValidationError(ValueError):
+    """计划JSON无法解析，或修复后仍未通过校验"""
+
+
+def parse_json_text(text: str) -> Any:
+    """解析模型输出的JSON，兼容外层包裹的```json代码块或多余的说明文字
+
+    Raises:
+        json.JSONDecodeError: 无法解析为JSON
+    """
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        # 截取第一个{或[到最后一个}或]之间的内容再试一次
+        starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+        end = max(text.rfind("}"), text.rfind("]"))
+        if not starts or end <= min(starts):
+            raise
+        return json.loads(text[min(starts):end + 1])
+
+
+def _fragment_path(loc: Tuple[Union[str, int], ...]) -> FragmentPath:
+    """把校验错误位置归并到需要修复的片段
+
+    片段是路径中第一个列表元素（如某个里程碑、某一天），
+    不在列表中的字段（如顶层的title）则是字段本身。
+    """
+    for i, key in enumerate(loc):
+        if isinstance(key, int):
+            return tuple(loc[:i + 1])
+    return tuple(loc[:1])
+
+
+def _get_at(data: Any, path: FragmentPath) -> Any:
+    for key in path:
+        try:
+            data = data[key]
+        except (KeyError, IndexError, TypeError):
+            return None
+    return data
+
+
+def _set_at(data: Dict[str, Any], path: FragmentPath, value: Any) -> None:
+    for key in path[:-1]:
+        data = data[key]
+    data[path[-1]] = value
+
+
+def _inline_refs(node: Any, defs: Dict[str, Any]) -> Any:
+    """展开JSON Schema中的$ref，得到自包含的片段Schema"""
+    if isinstance(node, dict):
+        if "$ref" in node:
+            return _inline_refs(defs[node["$ref"].split("/")[-1]], defs)
+        return {k: _inline_refs(v, defs) for k, v in node.items() if k != "$defs"}
+    if isinstance(node, list):
+        return [_inline_refs(item, defs) for item in node]
+    return node
+
+
+def _fragment_schema(schema: Type[BaseModel], path: FragmentPath) -> Dict[str, Any]:
+    """获取片段对应的JSON Schema"""
+    full_schema = schema.model_json_schema()
+    defs = full_schema.get("$defs", {})
+    node = full_schema
+    for key in path:
+        node = _inline_refs(node, defs)
+        node = node["items"] if isinstance(key, int) else node["properties"][key]
+    return _inline_refs(node, defs)
+
+
+def _format_path(path: FragmentPath) -> str:
+    return "".join(f"[{key}]" if isinstance(key, int) else f".{key}" for key in path).lstrip(".")
+
+
+def _repair_prompt(
+    prompt_manager: PromptManager,
+    schema: Type[BaseModel],
+    data: Dict[str, Any],
+    path: FragmentPath,
+    errors: List[str],
+    context: str,
+) -> str:
+    """构建修复单个片段的prompt"""
+    fragment = _get_at(data, path)
+    return prompt_manager.get_prompt(
+        "repair_fragment",
+        context=context,
+        fragment_path=_format_path(path),
+        fragment=json.dumps(fragment, indent=2, ensure_ascii=False),
+        errors="\n".join(f"- {error}" for error in errors),
+        fragment_schema=json.dumps(_fragment_schema(schema, path), ensure_ascii=False),
+    )
+
+
+def _repair_prompts(
+    prompt_manager: PromptManager,
+    schema: Type[BaseModel],
+    data: Dict[str, Any],
+    fragments: Dict[FragmentPath, List[str]],
+    context: str,
+) -> Dict[FragmentPath, str]:
+    """构建本轮各片段的修复prompt"""
+    prompts = {}
+    for path, errors in fragments.items():
+        logger.info(f"Repairing plan fragment {_format_path(path)}...")
+        prompts[path] = _repair_prompt(prompt_manager, schema, data, path, errors, context)
+    return prompts
+
+
+def _apply_repairs(data: Dict[str, Any], responses: Dict[FragmentPath, Union[str, BaseException]]) -> bool:
+    """把修复结果合并回文档
+
+    修复调用失败或结果无法解析时保留原片段，下一轮重试。
+
+    Args:
+        data: 待修复的计划文档
+        responses: 片段路径到模型输出或调用异常的字典
+
+    Returns:
+        修复调用超过截止时间、应停止修复时返回True
+    """
+    deadline_exceeded = False
+    for path, response in responses.items():
+        if isinstance(response, BaseException) and not isinstance(response, Exception):
+            raise response
+        if isinstance(response, DeadlineExceeded):
+            logger.warning(f"Repair of fragment {_format_path(path)} stopped: {response}")
+            deadline_exceeded = True
+            continue
+        if isinstance(response, Exception):
+            logger.warning(f"Repair call for fragment {_format_path(path)} failed: {response}")
+            continue
+        try:
+            _set_at(data, path, parse_json_text(response))
+        except json.JSONDecodeError as e:
+            logger.warning(f"Repair of fragment {_format_path(path)} returned invalid JSON: {e}")
+    return deadline_exceeded
+
+
+def _parse_plan_data(text: str) -> Dict[str, Any]:
+    """解析待校验的计划JSON
+
+    Raises:
+        PlanValidationError: 无法解析为JSON对象
+    """
+    try:
+        data = parse_json_text(text)
+    except json.JSONDecodeError as e:
+        raise PlanValidationError(f"Plan is not valid JSON: {e}") from e
+    if not isinstance(data, dict):
+        raise PlanValidationError(f"Plan JSON must be an object, got {type(data).__name__}")
+    return data
+
+
+def _group_errors(validation_error: ValidationError) -> Dict[FragmentPath, List[str]]:
+    """按片段归并校验错误"""
+    fragments: Dict[FragmentPath, List[str]] = {}
+    for error in validation_error.errors():
+        path = _fragment_path(error["loc"])
+        fragments.setdefault(path, []).append(
+            f"{_format_path(tuple(error['loc']))}: {error['msg']}"
+        )
+    return fragments
+
+
+# 修复轮次：每轮产出各片段的修复prompt，接收各片段的模型输出或调用异常，结束时返回通过校验的计划
+RepairRounds = Generator[Dict[FragmentPath, str], Dict[FragmentPath, Union[str, BaseException]], PlanT]
+
+
+def _repair_rounds(
+    text: str,
+    schema: Type[PlanT],
+    prompt_manager: Optional[PromptManager],
+    context: str,
+    max_rounds: Optional[int],
+) -> RepairRounds:
+    """validate_plan和avalidate_plan共用的校验与修复循环，不发起模型调用
+
+    调用方对产出的每个片段发起修复调用，再把结果send回来；
+    prompt_manager为空时只校验不修复。
+
+    Raises:
+        PlanValidationError: 无法解析为JSON，或修复后仍未通过校验（包括修复调用超过截止时间）
+    """
+    data = _parse_plan_data(text)
+    max_rounds = settings.plan_repair_max_rounds if max_rounds is None else max_rounds
+    round_no = 0
+    deadline_exceeded = False
+    while True:
+        try:
+            return schema.model_validate(data)
+        except ValidationError as e:
+            validation_error = e
+        if prompt_manager is None or round_no >= max_rounds or deadline_exceeded:
+            raise PlanValidationError(
+                f"{schema.__name__} failed validation after {round_no} repair rounds: {validation_error}"
+            ) from validation_error
+        round_no += 1
+
+        fragments = _group_errors(validation_error)
+        logger.warning(
+            f"{schema.__name__} failed validation, repairing {len(fragments)} fragments "
+            f"(round {round_no}/{max_rounds}): {', '.join(_format_path(p) for p in fragments)}"
+        )
+        responses = yield _repair_prompts(prompt_manager, schema, data, fragments, context)
+        deadline_exceeded = _apply_repairs(data, responses)
+
+
+def validate_plan(
+    text: str,
+    schema: Type[PlanT],
+    model_client: Optional[ModelClient] = None,
+    prompt_manager: Optional[PromptManager] = None,
+    context: str = "",
+    max_rounds: Optional[int] = None,
+) -> PlanT:
+    """按Schema校验模型输出的计划JSON，只对未通过校验的片段发起修复调用
+
+    每一轮把校验错误归并到片段（如某个里程碑、某一天），并行修复这些片段，
+    合并回文档后重新校验整个文档。修复调用失败时保留原片段，
+    超过截止时间时停止修复。
+
+    Args:
+        text: 模型输出的计划JSON文本
+        schema: 计划Schema，如OverallPlan、DailyPlan
+        model_client: 用于修复的模型客户端，为空时只校验不修复
+        prompt_manager: prompt管理器，为空时只校验不修复
+        context: 修复时提供给模型的上下文，如用户背景、对应的里程碑
+        max_rounds: 最大修复轮数，默认使用配置文件中的值
+
+    Returns:
+        通过校验的计划
+
+    Raises:
+        PlanValidationError: 无法解析为JSON，或修复后仍未通过校验（包括修复调用超过截止时间）
+    """
+    rounds = _repair_rounds(text, schema, prompt_manager if model_client is not None else None, context, max_rounds)
+    try:
+        prompts = next(rounds)
+        while True:
+            with ThreadPoolExecutor(max_workers=len(prompts)) as executor:
+                futures = {path: executor.submit(model_client.generate, prompt) for path, prompt in prompts.items()}
+                responses = {path: future.exception() or future.result() for path, future in futures.items()}
+            prompts = rounds.send(responses)
+    except StopIteration as stop:
+        return stop.value
+
+
+async def avalidate_plan(
+    text: str,
+    schema: Type[PlanT],
+    model_client: Optional[ModelClient] = None,
+    prompt_manager: Optional[PromptManager] = None,
+    context: str = "",
+    max_rounds: Optional[int] = None,
+) -> PlanT:
+    """validate_plan的异步版本，同一轮的片段用asyncio.gather并发修复"""
+    rounds = _repair_rounds(text, schema, prompt_manager if model_client is not None else None, context, max_rounds)
+    try:
+        prompts = next(rounds)
+        while True:
+            results = await asyncio.gather(
+                *(model_client.agenerate(prompt) for prompt in prompts.values()), return_exceptions=True
+            )
+            prompts = rounds.send(dict(zip(prompts, results)))
+    except StopIteration as stop:
+        return stop.value
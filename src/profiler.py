@@ -0,0 +1,228 @@
+from collections import Counter, defaultdict
+from types import CodeType, FrameType
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import logging
+import os
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 本项目源码目录，只统计正在执行本项目代码的线程（以及网络调用线程）
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 样本分类：等待模型平台响应、本地计算、等待其他线程
+NETWORK = "network"
+LOCAL = "local"
+WAIT = "wait"
+
+# 不属于任何节点的样本，如编译工作流图、保存运行清单
+OUTSIDE_NODES = "(workflow)"
+# 多个节点并发执行时无法归属的样本
+UNATTRIBUTED = "(unattributed)"
+
+# 叶子帧为这些函数时，线程正阻塞在锁或条件变量上
+_WAIT_FUNCTIONS = {"wait", "acquire", "join", "_wait_for_tstate_lock", "result", "get"}
+_WAIT_FILES = ("threading.py", "_base.py", "queue.py")
+
+
+def _frame_label(code: CodeType) -> str:
+    """帧标签：文件路径（相对site-packages或项目目录）和函数名"""
+    filename = code.co_filename
+    marker = "site-packages" + os.sep
+    if marker in filename:
+        filename = filename.split(marker, 1)[1]
+    elif filename.startswith(os.getcwd() + os.sep):
+        filename = os.path.relpath(filename)
+    else:
+        filename = os.path.basename(filename)
+    return f"{filename}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class SamplingProfiler:
+    """采样分析器：周期性采样所有线程的调用栈，区分网络等待和本地计算
+
+    cProfile只能分析启用它的线程，而工作流的模型调用和片段修复在线程池中执行，
+    因此这里用sys._current_frames()对所有线程采样。每个样本按调用栈归属到节点：
+    栈中包含节点函数时归属该节点，线程池线程则归属同一时刻正在执行的节点。
+
+    用法：
+        with SamplingProfiler(phases, network_functions) as profiler:
+            ...
+        profiler.save(output_dir)
+
+    同一进程内有多个并发运行时，各运行的样本会混在一起。
+    """
+
+    def __init__(
+        self,
+        phases: Optional[Dict[str, CodeType]] = None,
+        network_functions: Iterable[CodeType] = (),
+        network_thread_prefixes: Iterable[str] = (),
+        ignored_thread_prefixes: Iterable[str] = (),
+        interval: float = 0.005,
+    ):
+        """初始化SamplingProfiler
+
+        Args:
+            phases: 节点名称到节点函数代码对象的映射，用于按节点归属样本
+            network_functions: 调用栈中出现这些函数时视为等待网络
+            network_thread_prefixes: 这些名称前缀的线程只用于发起网络调用
+            ignored_thread_prefixes: 这些名称前缀的辅助线程（如内存采样、续租）不计入样本
+            interval: 采样间隔（秒）
+        """
+        self.phases = {code: name for name, code in (phases or {}).items()}
+        self.network_functions = set(network_functions)
+        self.network_thread_prefixes = tuple(network_thread_prefixes)
+        self.ignored_thread_prefixes = tuple(ignored_thread_prefixes)
+        self.interval = interval
+        # (节点, 分类, 调用栈) -> 秒数
+        self.stacks: Counter = Counter()
+        self.wall_seconds = 0.0
+        self.samples = 0
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started_at = 0.0
+
+    def __enter__(self) -> "SamplingProfiler":
+        self._stop_event.clear()
+        self._started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample_loop, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.wall_seconds = time.perf_counter() - self._started_at
+        logger.info(f"Profiler collected {self.samples} samples over {self.wall_seconds:.1f}s")
+
+    def _sample_loop(self) -> None:
+        last = time.perf_counter()
+        while not self._stop_event.wait(self.interval):
+            now = time.perf_counter()
+            self._sample(now - last)
+            last = now
+
+    def _sample(self, elapsed: float) -> None:
+        """采样一次所有线程，每个样本计入距上次采样经过的时间"""
+        thread_names = {t.ident: t.name for t in threading.enumerate()}
+        own_ident = threading.get_ident()
+        samples: List[Tuple[Optional[str], str, Tuple[str, ...]]] = []
+        for ident, frame in sys._current_frames().items():
+            thread_name = thread_names.get(ident, "")
+            # 辅助线程大部分时间在等待下一次采样，计入会夸大等待时间
+            if ident == own_ident or thread_name.startswith(self.ignored_thread_prefixes):
+                continue
+            sample = self._classify(frame, thread_name)
+            if sample is not None:
+                samples.append(sample)
+
+        # 线程池线程的栈中没有节点函数，归属同一时刻正在执行的节点
+        active_phases = {phase for phase, _, _ in samples if phase is not None}
+        fallback = next(iter(active_phases)) if len(active_phases) == 1 else (
+            UNATTRIBUTED if active_phases else OUTSIDE_NODES
+        )
+        for phase, category, stack in samples:
+            self.stacks[(phase or fallback, category, stack)] += elapsed
+        self.samples += 1
+
+    def _classify(self, frame: FrameType, thread_name: str) -> Optional[Tuple[Optional[str], str, Tuple[str, ...]]]:
+        """确定样本所属节点和分类，不属于本项目的线程返回None"""
+        codes = []
+        while frame is not None:
+            codes.append(frame.f_code)
+            frame = frame.f_back
+        codes.reverse()
+
+        network_thread = thread_name.startswith(self.network_thread_prefixes)
+        if not network_thread and not any(code.co_filename.startswith(SOURCE_DIR) for code in codes):
+            return None
+
+        phase = next((self.phases[code] for code in reversed(codes) if code in self.phases), None)
+        leaf = codes[-1]
+        if network_thread or any(code in self.network_functions for code in codes):
+            category = NETWORK
+        elif leaf.co_name in _WAIT_FUNCTIONS and leaf.co_filename.endswith(_WAIT_FILES):
+            category = WAIT
+        else:
+            category = LOCAL
+        return phase, category, tuple(_frame_label(code) for code in codes)
+
+    def summary(self, top: int = 10) -> Dict[str, Dict[str, Any]]:
+        """按节点汇总网络等待、本地计算和等待其他线程的时间，以及本地热点
+
+        Args:
+            top: 每个节点保留的本地热点数量
+
+        Returns:
+            节点名称到汇总信息的字典，热点按自身耗时（调用栈叶子帧）排序
+        """
+        totals: Dict[str, Counter] = defaultdict(Counter)
+        hotspots: Dict[str, Counter] = defaultdict(Counter)
+        for (phase, category, stack), seconds in self.stacks.items():
+            totals[phase][category] += seconds
+            if category == LOCAL:
+                hotspots[phase][stack[-1]] += seconds
+
+        summary = {}
+        for phase, total in totals.items():
+            summary[phase] = {
+                "network_seconds": round(total[NETWORK], 3),
+                "local_seconds": round(total[LOCAL], 3),
+                "wait_seconds": round(total[WAIT], 3),
+                "hotspots": [
+                    {"function": label, "self_seconds": round(seconds, 3)}
+                    for label, seconds in hotspots[phase].most_common(top)
+                ],
+            }
+        return summary
+
+    def save(self, profile_dir: str, top: int = 10) -> Dict[str, str]:
+        """写入火焰图格式的调用栈和按节点的热点汇总表
+
+        Args:
+            profile_dir: 输出目录
+            top: 每个节点在汇总表中列出的本地热点数量
+
+        Returns:
+            包含stacks（折叠调用栈，可用flamegraph.pl或speedscope打开）和summary（Markdown汇总表）路径的字典
+        """
+        os.makedirs(profile_dir, exist_ok=True)
+
+        # 折叠调用栈格式：每行"帧;帧;帧 权重"，根帧为节点和分类，权重为毫秒
+        stacks_path = os.path.join(profile_dir, "stacks.folded")
+        with open(stacks_path, "w", encoding="utf-8") as f:
+            for (phase, category, stack), seconds in sorted(self.stacks.items()):
+                weight = max(1, round(seconds * 1000))
+                f.write(f"{';'.join((phase, f'[{category}]') + stack)} {weight}\n")
+
+        summary = self.summary(top)
+        lines = [
+            "# 性能分析汇总",
+            "",
+            f"采样 {self.samples} 次，间隔 {self.interval * 1000:g} ms，运行耗时 {self.wall_seconds:.1f} s。"
+            "时间按线程累计，多个线程同时工作时合计可能超过运行耗时。",
+            "",
+            "| 节点 | 网络等待(s) | 本地计算(s) | 等待其他线程(s) |",
+            "| --- | --- | --- | --- |",
+        ]
+        for phase, item in summary.items():
+            lines.append(
+                f"| {phase} | {item['network_seconds']:.3f} | {item['local_seconds']:.3f} | {item['wait_seconds']:.3f} |"
+            )
+        for phase, item in summary.items():
+            if not item["hotspots"]:
+                continue
+            lines.extend(["", f"## {phase} 本地热点", "", "| 函数 | 自身耗时(s) |", "| --- | --- |"])
+            for hotspot in item["hotspots"]:
+                lines.append(f"| `{hotspot['function']}` | {hotspot['self_seconds']:.3f} |")
+
+        summary_path = os.path.join(profile_dir, "summary.md")
+        with open(summary_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+        logger.info(f"Profile saved to {stacks_path} and {summary_path}")
+        return {"stacks": stacks_path, "summary": summary_path}
@@ -0,0 +1,97 @@
+from typing import Optional
+import logging
+import os
+import sys
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 采样线程名称，性能分析时排除
+MONITOR_THREAD_NAME = "peak-rss-monitor"
+
+
+def current_rss_bytes() -> Optional[int]:
+    """获取当前进程的常驻内存（RSS），无法获取时返回None"""
+    try:
+        # Linux下从/proc读取当前RSS
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        # 其他平台退化为进程历史峰值
+        import resource
+
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS单位为字节，Linux为KB
+        return max_rss if sys.platform == "darwin" else max_rss * 1024
+    except (ImportError, OSError):
+        return None
+
+
+class PeakRSSMonitor:
+    """在一次运行期间周期性采样进程RSS，记录峰值
+
+    用法：
+        with PeakRSSMonitor() as monitor:
+            ...
+        monitor.peak_rss_mb
+
+    同一进程内有多个并发运行时，测得的是该运行时间窗口内整个进程的峰值，
+    配合rss_growth_mb（峰值相对开始时的增长）可以估算并发运行的内存打包情况。
+    """
+
+    def __init__(self, interval: float = 0.1):
+        """初始化PeakRSSMonitor
+
+        Args:
+            interval: 采样间隔（秒）
+        """
+        self.interval = interval
+        self.start_rss_bytes: Optional[int] = None
+        self.peak_rss_bytes: Optional[int] = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "PeakRSSMonitor":
+        self.start_rss_bytes = current_rss_bytes()
+        self.peak_rss_bytes = self.start_rss_bytes
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._sample_loop, name=MONITOR_THREAD_NAME, daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._sample()
+        logger.info(
+            f"Peak RSS during run: {self.peak_rss_mb} MB (growth {self.rss_growth_mb} MB)"
+        )
+
+    def _sample_loop(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            self._sample()
+
+    def _sample(self) -> None:
+        rss = current_rss_bytes()
+        if rss is not None and (self.peak_rss_bytes is None or rss > self.peak_rss_bytes):
+            self.peak_rss_bytes = rss
+
+    @property
+    def peak_rss_mb(self) -> Optional[float]:
+        """运行期间的进程RSS峰值（MB）"""
+        if self.peak_rss_bytes is None:
+            return None
+        return round(self.peak_rss_bytes / 1024 / 1024, 1)
+
+    @property
+    def rss_growth_mb(self) -> Optional[float]:
+        """运行期间RSS峰值相对开始时的增长（MB）"""
+        if self.peak_rss_bytes is None or self.start_rss_bytes is None:
+            return None
+        return round((self.peak_rss_bytes - self.start_rss_bytes) / 1024 / 1024, 1)
@@ -0,0 +1,82 @@
+from typing import Annotated, Any, List
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field
+import json
+
+
+def _to_text(value: Any) -> Any:
+    """把模型偶尔输出的列表、数字等统一转换为字符串"""
+    if isinstance(value, list):
+        return "\n".join(str(_to_text(item)) for item in value)
+    if isinstance(value, dict):
+        return json.dumps(value, ensure_ascii=False)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    return value
+
+
+def _to_text_list(value: Any) -> Any:
+    """把模型偶尔输出的单个字符串统一转换为字符串列表"""
+    if isinstance(value, str):
+        return [value] if value.strip() else []
+    if isinstance(value, list):
+        return [_to_text(item) for item in value]
+    return value
+
+
+# 字符串字段：兼容列表和数字
+Text = Annotated[str, BeforeValidator(_to_text)]
+# 字符串列表字段：兼容单个字符串
+TextList = Annotated[List[str], BeforeValidator(_to_text_list)]
+
+
+class PlanModel(BaseModel):
+    """计划模型基类，保留模型输出的额外字段"""
+    model_config = ConfigDict(extra="allow")
+
+
+class Milestone(PlanModel):
+    """双周里程碑"""
+    week_range: Text = Field(description='双周范围（如"Week 1-2"）')
+    goal: Text = Field(description="里程碑目标")
+    skills: TextList = Field(description="需掌握的技能列表")
+    projects: TextList = Field(description="项目产出要求")
+    resources: TextList = Field(default=[], description="推荐学习资源")
+
+
+class OverallPlan(PlanModel):
+    """双周粒度的总计划，对应final_plan.md和critical_think.md的输出格式"""
+    title: Text = Field(description="计划标题")
+    overview: Text = Field(default="", description="计划概述")
+    duration: Text = Field(default="", description="计划时长")
+    milestones: List[Milestone] = Field(min_length=1, description="双周里程碑数组")
+    final_goal: Text = Field(description="最终目标描述")
+    success_criteria: TextList = Field(default=[], description="成功标准")
+    risk_management: Text = Field(default="", description="风险管理策略")
+    risk_notes: Text = Field(default="", description="风险提示和注意事项")
+
+
+class DailyTask(PlanModel):
+    """每日任务"""
+    title: Text = Field(description="任务标题")
+    description: Text = Field(default="", description="任务描述")
+    duration_hours: float = Field(ge=0, description="预计时长（小时）")
+    skills: TextList = Field(default=[], description="涉及的技能")
+    expected_outcome: Text = Field(default="", description="预期成果")
+
+
+class DaySchedule(PlanModel):
+    """单日计划"""
+    day: Text = Field(description='第几天（如"Day 1"）')
+    date: Text = Field(default="", description='日期范围（如"Week 1, Day 1"）')
+    tasks: List[DailyTask] = Field(min_length=1, description="当日任务列表")
+    total_hours: float = Field(ge=0, description="当日总时长")
+    rest_time: Text = Field(default="", description="休息时间安排")
+    learning_tips: Text = Field(default="", description="学习建议")
+
+
+class DailyPlan(PlanModel):
+    """双周的日粒度计划，对应daily_plan.md的输出格式"""
+    week_range: Text = Field(description='双周范围（如"Week 1-2"）')
+    total_hours: float = Field(ge=0, description="总学习时长")
+    daily_schedule: List[DaySchedule] = Field(min_length=1, description="每日计划数组")
+    week_summary: Text = Field(default="", description="双周学习总结和回顾建议")
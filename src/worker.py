@@ -0,0 +1,184 @@
+from typing import Any, Dict, Optional
+import logging
+import os
+import shutil
+import socket
+import threading
+import uuid
+
+from .config import settings
+from .job_queue import HEARTBEAT_THREAD_PREFIX, Job, JobQueue, JobStatus
+from .workflow import run_workflow
+
+logger = logging.getLogger(__name__)
+
+
+def job_output_dir(job: Job) -> str:
+    """任务的输出目录：负载中指定的output_dir，未指定时按任务ID区分，避免多个任务互相覆盖"""
+    return job.payload.get("output_dir") or os.path.join(settings.output_dir, job.id)
+
+
+def run_job(
+    job: Job,
+    profile: bool = False,
+    output_dir: Optional[str] = None,
+    cancel_event: Optional[threading.Event] = None,
+) -> Dict[str, Any]:
+    """执行单个任务：根据任务负载运行工作流
+
+    Args:
+        job: 任务，负载包含user_background、user_goal，以及可选的output_dir、deadline_seconds
+        profile: 是否采样分析本地计算开销
+        output_dir: 实际写入的目录，默认为job_output_dir(job)
+        cancel_event: 设置后停止任务的模型调用
+
+    Returns:
+        写入队列的任务结果
+    """
+    payload = job.payload
+    result = run_workflow(
+        payload["user_background"],
+        payload["user_goal"],
+        output_dir or job_output_dir(job),
+        deadline_seconds=payload.get("deadline_seconds"),
+        profile=profile,
+        cancel_event=cancel_event,
+    )
+    return {
+        "output_dir": result["output_dir"],
+        "peak_rss_mb": result.get("peak_rss_mb"),
+        "run_status": result.get("run_status"),
+        "pending_periods": result.get("pending_periods", []),
+    }
+
+
+def publish_output(staging_dir: str, output_dir: str) -> None:
+    """把临时目录中的输出合并到输出目录（同名文件覆盖），然后删除临时目录"""
+    shutil.copytree(staging_dir, output_dir, dirs_exist_ok=True)
+    shutil.rmtree(staging_dir, ignore_errors=True)
+
+
+class Worker:
+    """从任务队列中领取并执行任务的worker
+
+    执行任务期间由后台线程定期续租，worker崩溃时租约过期，任务会被其他worker重新领取。
+    任务先输出到本worker的临时目录，提交结果成功后才合并到输出目录；
+    租约被其他worker接手时停止任务并丢弃输出，避免两个worker同时写入同一目录。
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        worker_id: Optional[str] = None,
+        lease_seconds: Optional[float] = None,
+        heartbeat_seconds: Optional[float] = None,
+        poll_seconds: Optional[float] = None,
+        profile: bool = False,
+    ):
+        """初始化Worker
+
+        Args:
+            queue: 任务队列
+            worker_id: worker标识，默认由主机名、进程号和随机后缀组成
+            lease_seconds: 任务租约时长，默认使用配置文件中的值
+            heartbeat_seconds: 续租间隔，默认使用配置文件中的值
+            poll_seconds: 队列为空时的轮询间隔，默认使用配置文件中的值
+            profile: 是否采样分析每个任务的本地计算开销
+        """
+        self.queue = queue
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.lease_seconds = lease_seconds or settings.job_lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds or settings.job_heartbeat_seconds
+        self.poll_seconds = poll_seconds or settings.worker_poll_seconds
+        self.profile = profile
+        self._stop_event = threading.Event()
+
+    def stop(self) -> None:
+        """请求worker在当前任务完成后退出"""
+        self._stop_event.set()
+
+    def run(self, max_jobs: Optional[int] = None, exit_when_empty: bool = False) -> int:
+        """循环领取并执行任务
+
+        Args:
+            max_jobs: 最多执行的任务数，默认不限
+            exit_when_empty: 队列为空时是否退出
+
+        Returns:
+            已处理的任务数
+        """
+        logger.info(f"Worker {self.worker_id} started")
+        processed = 0
+        while not self._stop_event.is_set():
+            if max_jobs is not None and processed >= max_jobs:
+                break
+            job = self.queue.claim(self.worker_id, self.lease_seconds)
+            if job is None:
+                if exit_when_empty:
+                    break
+                self._stop_event.wait(self.poll_seconds)
+                continue
+            self.process(job)
+            processed += 1
+        logger.info(f"Worker {self.worker_id} stopped after processing {processed} jobs")
+        return processed
+
+    def process(self, job: Job) -> str:
+        """执行已领取的任务，并在队列中记录结果
+
+        Returns:
+            任务的最终状态
+        """
+        logger.info(f"Worker {self.worker_id} processing job {job.id}")
+        output_dir = job_output_dir(job)
+        staging_dir = f"{output_dir.rstrip(os.sep)}.{self.worker_id}.tmp"
+        finished = threading.Event()
+        lease_lost = threading.Event()
+        heartbeat_thread = threading.Thread(
+            target=self._heartbeat_loop,
+            args=(job.id, finished, lease_lost),
+            name=f"{HEARTBEAT_THREAD_PREFIX}{job.id[:8]}",
+            daemon=True,
+        )
+        heartbeat_thread.start()
+        try:
+            result = run_job(job, self.profile, staging_dir, lease_lost)
+        except Exception as e:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            if lease_lost.is_set():
+                logger.warning(f"Job {job.id} stopped after its lease was taken over, output discarded")
+                return JobStatus.RUNNING
+            logger.error(f"Job {job.id} failed: {e}")
+            logger.exception("Full error traceback:")
+            status = self.queue.fail(job.id, self.worker_id, f"{type(e).__name__}: {e}")
+            if status == JobStatus.DEAD:
+                logger.error(f"Job {job.id} moved to dead letter after {job.attempts} attempts")
+            elif status == JobStatus.PENDING:
+                logger.info(f"Job {job.id} will be retried")
+            else:
+                logger.warning(f"Lease of job {job.id} was lost, failure not recorded")
+            return status or JobStatus.RUNNING
+        finally:
+            finished.set()
+            heartbeat_thread.join()
+
+        result["output_dir"] = output_dir
+        if not lease_lost.is_set() and self.queue.complete(job.id, self.worker_id, result):
+            publish_output(staging_dir, output_dir)
+            logger.info(f"Job {job.id} succeeded, output saved to {output_dir}")
+            return JobStatus.SUCCEEDED
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        logger.warning(f"Lease of job {job.id} was lost, result and output discarded")
+        return JobStatus.RUNNING
+
+    def _heartbeat_loop(self, job_id: str, finished: threading.Event, lease_lost: threading.Event) -> None:
+        """执行任务期间定期续租，租约被其他worker接手时设置lease_lost以停止任务"""
+        while not finished.wait(self.heartbeat_seconds):
+            try:
+                if not self.queue.heartbeat(job_id, self.worker_id, self.lease_seconds):
+                    logger.warning(f"Lease of job {job_id} was taken over by another worker, stopping it")
+                    lease_lost.set()
+                    return
+            except Exception as e:
+                # 续租失败不中断任务，等待下一次续租
+                logger.warning(f"Heartbeat for job {job_id} failed: {e}")
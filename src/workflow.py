@@ -1,64 +1,102 @@
-from typing import Dict, Any, List
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple, Type, Union
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from datetime import datetime
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, END
 from pydantic import BaseModel
 import logging
+import math
 import os
+import re
 import json
+import string
+import threading
 from .config import settings
-from .model_client import ModelClient
+from .model_client import ModelClient, ModelRouter
 from .prompt_manager import PromptManager
+from .artifact_store import get_artifact_store
+from .resource_monitor import MONITOR_THREAD_NAME, PeakRSSMonitor
+from .job_queue import HEARTBEAT_THREAD_PREFIX
+from .profiler import SamplingProfiler
+from .deadline import Deadline, DeadlineExceeded
+from .schemas import PlanModel, OverallPlan, DailyPlan
+from .plan_repair import PlanValidationError, parse_json_text, validate_plan
 
 logger = logging.getLogger(__name__)
 
 
 class PlanState(BaseModel):
-    """工作流状态类"""
+    """工作流状态类
+
+    大文本（各阶段生成的计划）只以ArtifactStore中的引用形式保存在状态中，
+    模型客户端和prompt管理器通过运行配置传入，不放入状态，
+    以降低LangGraph在节点间复制和校验状态的开销。
+    """
     # 输入数据
     user_background: str
     user_goal: str
     original_question: str
     
-    # 生成的计划
-    initial_plan: str = ""
-    revised_plans: List[str] = []
-    comparison_result: str = ""
-    final_plan: str = ""
-    daily_plans: Dict[str, str] = {}
+    # 生成的计划（ArtifactStore引用）
+    initial_plan_ref: str = ""
+    revised_plan_refs: List[str] = []
+    comparison_result_ref: str = ""
+    # 淘汰赛晋级的修正计划序号，为空时最终计划基于全部修正计划
+    finalists: List[int] = []
+    final_plan_ref: str = ""
+    daily_plan_refs: Dict[str, str] = {}
     
     # 配置
     output_dir: str = settings.output_dir
     
-    # 客户端和管理器
-    model_client: ModelClient = None
-    prompt_manager: PromptManager = None
-    
-    class Config:
-        arbitrary_types_allowed = True
+    # 运行情况：截止时间临近时采取的降级措施，以及尚未生成的双周
+    degradations: List[str] = []
+    pending_periods: List[str] = []
 
 
-def init_clients(state: PlanState) -> PlanState:
-    """初始化客户端和管理器"""
-    logger.info("=== Entering init_clients node ===")
-    try:
-        logger.debug("Creating ModelClient instance...")
-        state.model_client = ModelClient()
-        logger.debug("Creating PromptManager instance...")
-        state.prompt_manager = PromptManager()
-        logger.info("=== Exiting init_clients node ===")
-        return state
-    except Exception as e:
-        logger.error(f"Error in init_clients node: {e}")
-        logger.exception("Full error traceback:")
-        raise
+# 修正计划的标签，修正计划数量不超过标签数量
+CANDIDATE_LABELS = string.ascii_uppercase
+
+# 计划对比方式：一次对比全部修正计划，或分组并行对比、胜出者晋级的淘汰赛
+COMPARE_MODE_SINGLE = "single"
+COMPARE_MODE_TOURNAMENT = "tournament"
+
+# 计划对比的评估维度
+COMPARE_DIMENSIONS = ["准确性", "完整性", "逻辑性", "可读性", "指令遵循"]
+
+# 跳过对比时填入prompt的占位内容：因时间不足跳过，或只有一份修正计划无需对比
+SKIPPED_COMPARISON = "（因时间不足已跳过计划对比）"
+SINGLE_PLAN_COMPARISON = "（只有一份修正计划，无需对比）"
+
+# 因时间不足跳过对比时记录的降级
+COMPARE_SKIPPED_DEGRADATION = "compare_plans=skipped"
+
+# 从对比结果的最终结论中提取最佳答案和核心理由
+_BEST_ANSWER_PATTERN = re.compile(r"最佳答案[^A-Za-z\n]*([A-Z])(?![A-Za-z])")
+_REASON_PATTERN = re.compile(r"核心理由[^:：\n]*[:：]\s*(.+)")
+
+
+def get_deadline(config: RunnableConfig) -> Deadline:
+    """从运行配置中获取运行的截止时间"""
+    return config["configurable"].get("deadline") or Deadline()
+
+
+def get_run_resources(config: RunnableConfig, node: str) -> Tuple[ModelClient, PromptManager]:
+    """从运行配置中获取指定节点使用的模型客户端和prompt管理器"""
+    configurable = config["configurable"]
+    return configurable["model_router"].client_for(node), configurable["prompt_manager"]
 
 
-def generate_initial_plan(state: PlanState) -> PlanState:
+def generate_initial_plan(state: PlanState, config: RunnableConfig) -> PlanState:
     """生成初始学习计划"""
     logger.info("=== Entering generate_initial_plan node ===")
     try:
+        model_client, prompt_manager = get_run_resources(config, "generate_initial_plan")
+        store = get_artifact_store()
         logger.debug("Getting initial_plan prompt...")
         # 获取初始计划prompt
-        prompt = state.prompt_manager.get_prompt(
+        prompt = prompt_manager.get_prompt(
             "initial_plan",
             user_background=state.user_background,
             user_goal=state.user_goal
@@ -66,7 +104,7 @@ def generate_initial_plan(state: PlanState) -> PlanState:
         
         logger.debug("Calling model to generate initial plan...")
         # 调用大模型生成初始计划
-        state.initial_plan = state.model_client.generate(prompt)
+        state.initial_plan_ref = store.put(model_client.generate(prompt))
         logger.info("Initial plan generated successfully")
         logger.info("=== Exiting generate_initial_plan node ===")
         return state
@@ -76,32 +114,55 @@ def generate_initial_plan(state: PlanState) -> PlanState:
         raise
 
 
-def critique_plan(state: PlanState) -> PlanState:
+def critique_candidates(state: PlanState, deadline: Deadline) -> int:
+    """确定修正计划数量，剩余时间不足时减少数量并记录降级"""
+    candidates = min(max(1, settings.critique_candidates), len(CANDIDATE_LABELS))
+    if deadline.below_fraction(settings.degrade_critique_below_fraction):
+        candidates = min(candidates, max(1, settings.degrade_min_candidates))
+        state.degradations = state.degradations + [f"critique_candidates={candidates}"]
+        logger.warning(
+            f"Only {deadline.remaining():.0f}s left, reducing revised plans to {candidates}"
+        )
+    return candidates
+
+
+def critical_think_prompt(prompt_manager: PromptManager, state: PlanState, initial_plan: str) -> str:
+    """构建审查初始计划、生成修正计划的prompt"""
+    return prompt_manager.get_prompt(
+        "critical_think",
+        user_question=state.original_question,
+        model_answer=initial_plan
+    )
+
+
+def critique_plan(state: PlanState, config: RunnableConfig) -> PlanState:
     """对初始计划进行批判性审查"""
     logger.info("=== Entering critique_plan node ===")
     try:
-        logger.debug("Starting critique process, will generate 3 revised plans...")
+        model_client, prompt_manager = get_run_resources(config, "critique_plan")
+        store = get_artifact_store()
+        initial_plan = store.get(state.initial_plan_ref)
         
-        # 生成三份修正计划
-        state.revised_plans = []
-        for i in range(3):
-            logger.info(f"Generating revised plan {i+1}/3...")
-            
-            logger.debug(f"Getting critical_think prompt for revision {i+1}...")
-            # 获取批判性思维prompt
-            prompt = state.prompt_manager.get_prompt(
-                "critical_think",
-                user_question=state.original_question,
-                model_answer=state.initial_plan
-            )
-            
-            logger.debug(f"Calling model to generate revised plan {i+1}...")
-            # 调用大模型生成修正计划
-            revised_plan = state.model_client.generate(prompt)
-            state.revised_plans.append(revised_plan)
-            logger.info(f"Revised plan {i+1}/3 generated successfully")
+        candidates = critique_candidates(state, get_deadline(config))
+        logger.debug(f"Starting critique process, will generate {candidates} revised plans...")
         
-        logger.info(f"Generated {len(state.revised_plans)} revised plans")
+        logger.debug("Getting critical_think prompt...")
+        # 获取批判性思维prompt，各份修正计划使用相同的prompt
+        prompt = critical_think_prompt(prompt_manager, state, initial_plan)
+
+        def generate_revised_plan(i: int) -> str:
+            logger.info(f"Generating revised plan {i+1}/{candidates}...")
+            # 多份修正计划需要独立采样，不与进行中的相同调用合并
+            revised_plan = model_client.generate(prompt, coalesce=False)
+            logger.info(f"Revised plan {i+1}/{candidates} generated successfully")
+            return store.put(revised_plan)
+
+        # 并行生成修正计划，结果按序号排列
+        with ThreadPoolExecutor(max_workers=candidates) as executor:
+            revised_plan_refs = list(executor.map(generate_revised_plan, range(candidates)))
+        
+        state.revised_plan_refs = revised_plan_refs
+        logger.info(f"Generated {len(state.revised_plan_refs)} revised plans")
         logger.info("=== Exiting critique_plan node ===")
         return state
     except Exception as e:
@@ -110,27 +171,188 @@ def critique_plan(state: PlanState) -> PlanState:
         raise
 
 
-def compare_plans(state: PlanState) -> PlanState:
-    """对比三份修正计划，分析它们的优点和缺点"""
+def skip_comparison(state: PlanState, deadline: Deadline) -> bool:
+    """只有一份修正计划时跳过对比；剩余时间不足时跳过对比并记录降级"""
+    if len(state.revised_plan_refs) < 2:
+        logger.info("Only one revised plan, skipping plan comparison")
+        state.comparison_result_ref = ""
+        return True
+    if not deadline.below_fraction(settings.degrade_skip_compare_below_fraction):
+        return False
+    logger.warning(f"Only {deadline.remaining():.0f}s left, skipping plan comparison")
+    state.degradations = state.degradations + [COMPARE_SKIPPED_DEGRADATION]
+    state.comparison_result_ref = ""
+    return True
+
+
+def compare_plans_prompt(
+    prompt_manager: PromptManager, original_question: str, candidates: List[Tuple[int, str]]
+) -> str:
+    """构建对比修正计划的prompt
+
+    Args:
+        prompt_manager: prompt管理器
+        original_question: 原问题
+        candidates: 参与对比的(修正计划序号, 修正计划)列表
+
+    Returns:
+        对比prompt，答案按修正计划序号标注为答案A、答案B……
+    """
+    labels = [CANDIDATE_LABELS[index] for index, _ in candidates]
+    answers = "\n\n".join(f"- **答案{label}**：\n\n{text}" for label, (_, text) in zip(labels, candidates))
+    score_table = [
+        "| 维度 | " + " | ".join(f"答案 {label} 得分" for label in labels) + " | 胜出者 | 简要对比评价 |",
+        "| :--- | " + " | ".join(":---:" for _ in labels) + " | :---: | :--- |",
+    ]
+    score_table += [f"| {dimension} |" + " |" * (len(labels) + 2) for dimension in COMPARE_DIMENSIONS]
+    score_table.append("| **总分** | " + " | ".join("**X**" for _ in labels) + " | | |")
+    return prompt_manager.get_prompt(
+        "compare_plans",
+        original_question=original_question,
+        answers=answers,
+        score_table="\n".join(score_table),
+        answer_analysis="\n".join(f"- **答案 {label} 分析**：[指出优点与具体的缺陷]" for label in labels),
+        labels="/".join(labels)
+    )
+
+
+def use_tournament(state: PlanState) -> bool:
+    """是否以淘汰赛方式对比：修正计划多于晋级数量时才需要淘汰"""
+    return (
+        settings.compare_mode == COMPARE_MODE_TOURNAMENT
+        and len(state.revised_plan_refs) > max(1, settings.compare_top_candidates)
+    )
+
+
+def tournament_groups(pool: List[int]) -> List[List[int]]:
+    """把本轮的修正计划均匀分组，每组不超过compare_group_size份"""
+    group_size = max(2, settings.compare_group_size)
+    top_candidates = max(1, settings.compare_top_candidates)
+    groups = math.ceil(len(pool) / group_size)
+    # 每组只有一名胜出者，最后一轮分组数不少于晋级数量，不足两份的组轮空晋级
+    groups = max(groups, min(top_candidates, len(pool) - 1))
+    # 轮流分配，各组数量最多相差一份
+    return [pool[i::groups] for i in range(groups)]
+
+
+def stop_tournament(state: PlanState, deadline: Deadline, round_no: int) -> bool:
+    """剩余时间不足时停止后续轮次并记录降级"""
+    if not deadline.below_fraction(settings.degrade_skip_compare_below_fraction):
+        return False
+    logger.warning(f"Stopping plan tournament after round {round_no}")
+    state.degradations = state.degradations + [f"compare_rounds={round_no}"]
+    return True
+
+
+def advance_winners(
+    round_no: int, groups: List[List[int]], comparisons: List[Optional[str]]
+) -> Tuple[List[int], List[str]]:
+    """从各组对比结果中解析胜出者
+
+    Args:
+        round_no: 轮次，从1开始
+        groups: 本轮各组的修正计划序号
+        comparisons: 各组的对比结果，只有一份修正计划的组为None
+
+    Returns:
+        (晋级的修正计划序号, 各组的精简对比结论)
+    """
+    winners, notes = [], []
+    for group, comparison in zip(groups, comparisons):
+        if comparison is None:
+            # 轮空直接晋级
+            winners.append(group[0])
+            continue
+        labels = [CANDIDATE_LABELS[index] for index in group]
+        matches = [label for label in _BEST_ANSWER_PATTERN.findall(comparison) if label in labels]
+        if matches:
+            winner = group[labels.index(matches[-1])]
+        else:
+            winner = group[0]
+            logger.warning(f"Failed to parse winner of {'/'.join(labels)}, advancing plan {labels[0]}")
+        reasons = _REASON_PATTERN.findall(comparison)
+        reason = f"理由：{reasons[-1].strip()}" if reasons else ""
+        notes.append(f"- 第{round_no}轮 {'/'.join(labels)}：计划{CANDIDATE_LABELS[winner]}胜出。{reason}")
+        winners.append(winner)
+    return winners, notes
+
+
+def tournament_round_prompts(
+    prompt_manager: PromptManager, state: PlanState, groups: List[List[int]]
+) -> List[Optional[str]]:
+    """构建一轮淘汰赛各组的对比prompt，只有一份修正计划的组为None"""
+    store = get_artifact_store()
+    return [
+        compare_plans_prompt(
+            prompt_manager,
+            state.original_question,
+            [(index, store.get(state.revised_plan_refs[index])) for index in group],
+        ) if len(group) > 1 else None
+        for group in groups
+    ]
+
+
+def finish_tournament(state: PlanState, pool: List[int], notes: List[str]) -> None:
+    """记录晋级的修正计划和精简对比结论"""
+    state.finalists = pool[:max(1, settings.compare_top_candidates)]
+    state.comparison_result_ref = get_artifact_store().put("\n".join(notes)) if notes else ""
+    logger.info(
+        f"Plan tournament finished, finalists: {', '.join(CANDIDATE_LABELS[i] for i in state.finalists)}"
+    )
+
+
+def compare_plans_tournament(
+    state: PlanState, model_client: ModelClient, prompt_manager: PromptManager, deadline: Deadline
+) -> None:
+    """淘汰赛方式对比：每轮各组并行对比，胜出者晋级，直到剩余数量不超过compare_top_candidates"""
+    pool = list(range(len(state.revised_plan_refs)))
+    notes: List[str] = []
+    round_no = 0
+    while len(pool) > max(1, settings.compare_top_candidates):
+        if round_no and stop_tournament(state, deadline, round_no):
+            break
+        round_no += 1
+        groups = tournament_groups(pool)
+        prompts = tournament_round_prompts(prompt_manager, state, groups)
+        logger.info(f"Tournament round {round_no}: comparing {len(pool)} plans in {len(groups)} groups")
+        with ThreadPoolExecutor(max_workers=len(prompts)) as executor:
+            comparisons = list(executor.map(
+                lambda prompt: model_client.generate(prompt) if prompt is not None else None, prompts
+            ))
+        pool, round_notes = advance_winners(round_no, groups, comparisons)
+        notes.extend(round_notes)
+    finish_tournament(state, pool, notes)
+
+
+def compare_plans(state: PlanState, config: RunnableConfig) -> PlanState:
+    """对比修正计划，分析它们的优点和缺点"""
     logger.info("=== Entering compare_plans node ===")
     try:
+        deadline = get_deadline(config)
+        if skip_comparison(state, deadline):
+            logger.info("=== Exiting compare_plans node ===")
+            return state
+        
+        model_client, prompt_manager = get_run_resources(config, "compare_plans")
+        store = get_artifact_store()
+        
+        if use_tournament(state):
+            compare_plans_tournament(state, model_client, prompt_manager, deadline)
+            logger.info("=== Exiting compare_plans node ===")
+            return state
+        
         logger.debug("Getting compare_plans prompt...")
         # 获取对比方案prompt
-        prompt = state.prompt_manager.get_prompt(
-            "compare_plans",
-            original_question=state.original_question,
-            answerA=state.revised_plans[0],
-            answerB=state.revised_plans[1],
-            answerC=state.revised_plans[2]
+        prompt = compare_plans_prompt(
+            prompt_manager,
+            state.original_question,
+            list(enumerate(store.get(ref) for ref in state.revised_plan_refs)),
         )
         
         logger.debug("Calling model to compare plans...")
         # 调用大模型对比计划
-        comparison_result = state.model_client.generate(prompt)
-        
-        # 从对比结果中提取最佳计划
-        logger.debug("Extracting best plan from comparison result...")
-        state.comparison_result = comparison_result
+        comparison_result = model_client.generate(prompt)
+        state.comparison_result_ref = store.put(comparison_result)
         logger.info("Plans compared successfully")
         logger.info("=== Exiting compare_plans node ===")
         return state
@@ -140,53 +362,87 @@ def compare_plans(state: PlanState) -> PlanState:
         raise
 
 
-def generate_final_plan(state: PlanState) -> PlanState:
+def skipped_comparison_text(state: PlanState) -> str:
+    """跳过对比时填入prompt的占位内容，只有因时间不足跳过时才说明降级"""
+    if COMPARE_SKIPPED_DEGRADATION in state.degradations:
+        return SKIPPED_COMPARISON
+    return SINGLE_PLAN_COMPARISON
+
+
+def final_plan_prompt(prompt_manager: PromptManager, state: PlanState) -> str:
+    """构建生成最终计划的prompt，淘汰赛模式下只包含晋级的修正计划"""
+    store = get_artifact_store()
+    indexes = state.finalists or range(len(state.revised_plan_refs))
+    plans = [
+        f"  - 计划{CANDIDATE_LABELS[index]}：\n  {store.get(state.revised_plan_refs[index])}"
+        for index in indexes
+    ]
+    return prompt_manager.get_prompt(
+        "final_plan",
+        original_question=state.original_question,
+        plan_count=len(plans),
+        plans="\n  \n".join(plans),
+        comparison_result=store.get(state.comparison_result_ref) or skipped_comparison_text(state)
+    )
+
+
+def save_final_plan(output_dir: str, final_plan: str) -> None:
+    """保存最终计划，能按Schema解析时另存JSON和Markdown格式"""
+    # 确保输出目录存在
+    os.makedirs(output_dir, exist_ok=True)
+    final_plan_path = os.path.join(output_dir, "overall_plan.md")
+    with open(final_plan_path, "w", encoding="utf-8") as f:
+        f.write(final_plan)
+    logger.info(f"Final plan saved to {final_plan_path}")
+    
+    # 保存JSON格式的最终计划
+    try:
+        # 按Schema解析JSON
+        final_plan_model = validate_plan(final_plan, OverallPlan)
+        # 保存JSON文件
+        final_plan_json_path = os.path.join(output_dir, "overall_plan.json")
+        with open(final_plan_json_path, "w", encoding="utf-8") as f:
+            json.dump(final_plan_model.model_dump(), f, indent=2, ensure_ascii=False)
+        logger.info(f"Final plan JSON saved to {final_plan_json_path}")
+        
+        # 生成并保存Markdown格式的最终计划
+        final_plan_md = json_to_markdown(final_plan_model)
+        final_plan_md_path = os.path.join(output_dir, "overall_plan_markdown.md")
+        with open(final_plan_md_path, "w", encoding="utf-8") as f:
+            f.write(final_plan_md)
+        logger.info(f"Final plan Markdown saved to {final_plan_md_path}")
+    except PlanValidationError as e:
+        logger.warning(f"Failed to parse final plan as JSON: {e}")
+
+
+def generate_final_plan(state: PlanState, config: RunnableConfig) -> PlanState:
     """生成最终的双周粒度计划"""
     logger.info("=== Entering generate_final_plan node ===")
     try:
+        model_client, prompt_manager = get_run_resources(config, "generate_final_plan")
+        store = get_artifact_store()
+        
         logger.debug("Getting final_plan prompt...")
         # 获取最终计划prompt
-        prompt = state.prompt_manager.get_prompt(
-            "final_plan",
-            original_question=state.original_question,
-            planA=state.revised_plans[0],
-            planB=state.revised_plans[1],
-            planC=state.revised_plans[2],
-            comparison_result=state.comparison_result
-        )
+        prompt = final_plan_prompt(prompt_manager, state)
         
         logger.debug("Calling model to generate final plan...")
         # 调用大模型生成最终计划
-        state.final_plan = state.model_client.generate(prompt)
+        final_plan = model_client.generate(prompt)
+        state.final_plan_ref = store.put(final_plan)
         logger.info("Final plan generated successfully")
         
-        # 立即保存最终计划
+        # 立即保存最终计划，修复调用失败或超时也不会丢失已生成的计划
         logger.info("Saving final plan immediately...")
-        # 确保输出目录存在
-        os.makedirs(state.output_dir, exist_ok=True)
-        final_plan_path = os.path.join(state.output_dir, "overall_plan.md")
-        with open(final_plan_path, "w", encoding="utf-8") as f:
-            f.write(state.final_plan)
-        logger.info(f"Final plan saved to {final_plan_path}")
+        save_final_plan(state.output_dir, final_plan)
         
-        # 保存JSON格式的最终计划
-        try:
-            # 解析JSON
-            final_plan_json = json.loads(state.final_plan)
-            # 保存JSON文件
-            final_plan_json_path = os.path.join(state.output_dir, "overall_plan.json")
-            with open(final_plan_json_path, "w", encoding="utf-8") as f:
-                json.dump(final_plan_json, f, indent=2, ensure_ascii=False)
-            logger.info(f"Final plan JSON saved to {final_plan_json_path}")
-            
-            # 生成并保存Markdown格式的最终计划
-            final_plan_md = json_to_markdown(final_plan_json)
-            final_plan_md_path = os.path.join(state.output_dir, "overall_plan_markdown.md")
-            with open(final_plan_md_path, "w", encoding="utf-8") as f:
-                f.write(final_plan_md)
-            logger.info(f"Final plan Markdown saved to {final_plan_md_path}")
-        except json.JSONDecodeError as e:
-            logger.warning(f"Failed to parse final plan as JSON: {e}")
+        # 校验最终计划，只修复未通过校验的片段
+        repaired_plan = repair_plan_text(
+            final_plan, OverallPlan, model_client, prompt_manager, state.original_question
+        )
+        if repaired_plan != final_plan:
+            state.final_plan_ref = store.put(repaired_plan)
+            save_final_plan(state.output_dir, repaired_plan)
         
         logger.info("=== Exiting generate_final_plan node ===")
         return state
@@ -196,70 +452,473 @@ def generate_final_plan(state: PlanState) -> PlanState:
         raise
 
 
-def generate_daily_plans(state: PlanState) -> PlanState:
+# 最终计划默认包含的双周数量（共12周）
+DAILY_PLAN_PERIODS = 6
+
+# 运行清单文件名，记录输入与各双周日计划的状态，供重新生成时使用
+RUN_MANIFEST_FILENAME = "run_manifest.json"
+
+# 运行状态：全部完成、因时间不足做了降级、部分双周日计划待生成
+RUN_STATUS_COMPLETED = "completed"
+RUN_STATUS_DEGRADED = "degraded"
+RUN_STATUS_PARTIAL = "partial"
+
+# 性能分析结果所在的子目录
+PROFILE_DIRNAME = "profile"
+
+
+def get_week_ranges(total_periods: int = DAILY_PLAN_PERIODS) -> List[str]:
+    """获取所有双周范围，如["Week 1-2", "Week 3-4", ...]"""
+    week_ranges = []
+    for i in range(total_periods):
+        week_start = i * 2 + 1
+        week_end = week_start + 1
+        week_ranges.append(f"Week {week_start}-{week_end}")
+    return week_ranges
+
+
+def normalize_week_range(week_range: str) -> str:
+    """将"week5-6"、"Week 5 - 6"等写法规范化为"Week 5-6"
+
+    Raises:
+        ValueError: 无法识别的双周范围
+    """
+    match = re.fullmatch(r"\s*week\s*(\d+)\s*-\s*(\d+)\s*", week_range, re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid week range: {week_range!r}, expected e.g. 'Week 5-6'")
+    return f"Week {int(match.group(1))}-{int(match.group(2))}"
+
+
+def normalize_week_range_or_none(week_range: str) -> Optional[str]:
+    """规范化双周范围，无法识别时返回None"""
+    try:
+        return normalize_week_range(week_range)
+    except ValueError:
+        return None
+
+
+def plan_week_ranges(final_plan: str) -> List[str]:
+    """可以生成日计划的双周：默认的双周范围，以及总计划里程碑中的双周"""
+    week_ranges = get_week_ranges()
+    try:
+        plan = validate_plan(final_plan, OverallPlan)
+    except PlanValidationError:
+        return week_ranges
+    milestone_ranges = [normalize_week_range_or_none(m.week_range) for m in plan.milestones]
+    return list(dict.fromkeys(week_ranges + [w for w in milestone_ranges if w]))
+
+
+def daily_plan_filename(week_range: str) -> str:
+    """将"Week 1-2"转换为文件名，如week1-2.md"""
+    return week_range.lower().replace(" ", "") + ".md"
+
+
+def daily_plan_prompt(
+    prompt_manager: PromptManager, user_background: str, final_plan: str, week_range: str
+) -> str:
+    """构建单个双周日计划的prompt"""
+    return prompt_manager.get_prompt(
+        "daily_plan",
+        user_background=user_background,
+        biweekly_plan=final_plan,
+        week_range=week_range
+    )
+
+
+def daily_batch_prompt(
+    prompt_manager: PromptManager, user_background: str, final_plan: str, batch: List[str]
+) -> str:
+    """构建多个双周批量日计划的prompt"""
+    return prompt_manager.get_prompt(
+        "daily_plan_batch",
+        user_background=user_background,
+        biweekly_plan=final_plan,
+        week_ranges="、".join(batch),
+    )
+
+
+def generate_daily_plan(
+    model_client: ModelClient,
+    prompt_manager: PromptManager,
+    user_background: str,
+    final_plan: str,
+    week_range: str,
+) -> str:
+    """为单个双周生成日粒度计划
+
+    Args:
+        model_client: 大模型客户端
+        prompt_manager: prompt管理器
+        user_background: 用户的技术背景介绍
+        final_plan: 最终双周计划
+        week_range: 双周范围，如"Week 1-2"
+
+    Returns:
+        大模型生成的日粒度计划
+    """
+    logger.debug(f"Getting daily_plan prompt for {week_range}...")
+    # 获取每日计划prompt
+    prompt = daily_plan_prompt(prompt_manager, user_background, final_plan, week_range)
+
+    logger.debug(f"Calling model to generate daily plan for {week_range}...")
+    # 调用大模型生成日粒度计划
+    daily_plan = model_client.generate(prompt)
+    # 校验日计划，只修复未通过校验的某一天
+    return repair_plan_text(
+        daily_plan,
+        DailyPlan,
+        model_client,
+        prompt_manager,
+        daily_repair_context(user_background, final_plan, week_range),
+    )
+
+
+class DailyBatchPlanner:
+    """批量生成日计划时的分批、拆分响应和用量估计，不发起模型调用，同步和异步版本共用
+
+    每批包含的双周数量由输出token预算和单个双周输出token数的估计决定，
+    估计值在每批完成后按实际用量调整。只剩一个双周的批次，以及被截断或
+    未通过校验的双周，记入retry_individually，由调用方单独重新生成。
+    """
+
+    def __init__(
+        self,
+        model_client: ModelClient,
+        prompt_manager: PromptManager,
+        user_background: str,
+        final_plan: str,
+        week_ranges: List[str],
+    ):
+        self.prompt_manager = prompt_manager
+        self.user_background = user_background
+        self.final_plan = final_plan
+        # 批量调用的输出预算不能超过模型允许的最大输出token数
+        self.budget = model_client.limit_output_tokens(settings.daily_batch_output_tokens)
+        self.period_tokens = settings.daily_period_output_tokens
+        self.pending = list(week_ranges)
+        self.retry_individually: List[str] = []
+
+    def next_batch(self) -> Optional[List[str]]:
+        """取出下一批双周，没有可以批量生成的双周时返回None"""
+        while self.pending:
+            batch_size = max(1, self.budget // max(1, self.period_tokens))
+            batch, self.pending = self.pending[:batch_size], self.pending[batch_size:]
+            if len(batch) > 1:
+                logger.info(f"Generating daily plans for {len(batch)} periods in one call: {', '.join(batch)}")
+                return batch
+            self.retry_individually.extend(batch)
+        return None
+
+    def prompt(self, batch: List[str]) -> str:
+        """构建本批的prompt"""
+        return daily_batch_prompt(self.prompt_manager, self.user_background, self.final_plan, batch)
+
+    def periods(self, batch: List[str], message: Any) -> List[Tuple[str, str, str]]:
+        """拆分批量响应
+
+        Returns:
+            [(双周范围, 待校验的计划JSON, 修复时的上下文)]，只包含完整输出的双周
+        """
+        periods = split_batch_response(message.content, batch)
+        return [
+            (
+                week_range,
+                json.dumps(periods[week_range], ensure_ascii=False),
+                daily_repair_context(self.user_background, self.final_plan, week_range),
+            )
+            for week_range in batch
+            if week_range in periods
+        ]
+
+    def finish_batch(self, batch: List[str], message: Any, completed: List[str]) -> None:
+        """记录需要单独重新生成的双周，并按实际用量调整估计"""
+        self.retry_individually.extend(batch_missing_periods(batch, completed, ModelClient.is_truncated(message)))
+        self.period_tokens = estimate_period_tokens(self.period_tokens, self.budget, message, len(completed))
+
+
+def generate_daily_plans_batched(
+    model_client: ModelClient,
+    prompt_manager: PromptManager,
+    user_background: str,
+    final_plan: str,
+    week_ranges: List[str],
+) -> Iterator[Tuple[str, str]]:
+    """把多个双周合并到一次调用中生成日粒度计划，分批规则见DailyBatchPlanner
+
+    Args:
+        model_client: 大模型客户端
+        prompt_manager: prompt管理器
+        user_background: 用户的技术背景介绍
+        final_plan: 最终双周计划
+        week_ranges: 需要生成的双周范围
+
+    Yields:
+        (双周范围, 日粒度计划)，按生成完成的顺序
+    """
+    planner = DailyBatchPlanner(model_client, prompt_manager, user_background, final_plan, week_ranges)
+    while True:
+        batch = planner.next_batch()
+        if batch is None:
+            break
+        message = model_client.generate_message(planner.prompt(batch), max_tokens=planner.budget)
+        completed = []
+        for week_range, period, context in planner.periods(batch, message):
+            try:
+                daily_plan = validate_plan(period, DailyPlan, model_client, prompt_manager, context)
+            except PlanValidationError as e:
+                logger.warning(f"Daily plan for {week_range} from batch failed validation: {e}")
+                continue
+            completed.append(week_range)
+            yield week_range, json.dumps(daily_plan.model_dump(), indent=2, ensure_ascii=False)
+        planner.finish_batch(batch, message, completed)
+
+    for week_range in planner.retry_individually:
+        logger.info(f"Generating daily plan for {week_range} individually...")
+        yield week_range, generate_daily_plan(
+            model_client, prompt_manager, user_background, final_plan, week_range
+        )
+
+
+def batch_missing_periods(batch: List[str], completed: List[str], truncated: bool) -> List[str]:
+    """批量响应中缺失或未通过校验、需要单独重新生成的双周"""
+    missing = [week_range for week_range in batch if week_range not in completed]
+    if missing:
+        logger.warning(
+            f"Batch returned {len(completed)}/{len(batch)} valid periods"
+            f"{' (truncated)' if truncated else ''}, will retry individually: {', '.join(missing)}"
+        )
+    return missing
+
+
+def estimate_period_tokens(period_tokens: int, budget: int, message: Any, completed: int) -> int:
+    """按批量调用的实际用量调整单个双周的输出token估计"""
+    output_tokens = ModelClient.output_tokens(message)
+    if ModelClient.is_truncated(message):
+        period_tokens = max(period_tokens, budget // max(1, completed) + 1)
+    elif output_tokens and completed:
+        period_tokens = int(output_tokens / completed * 1.1)
+    logger.debug(f"Estimated output tokens per period: {period_tokens}")
+    return period_tokens
+
+
+def split_batch_response(text: str, week_ranges: List[str]) -> Dict[str, Dict[str, Any]]:
+    """把批量日计划响应拆分为各双周的计划
+
+    响应被截断时尽量保留已经完整输出的双周。
+
+    Returns:
+        双周范围到计划JSON的字典，只包含完整输出的双周
+    """
+    try:
+        data = parse_json_text(text)
+        items = data.get("periods", []) if isinstance(data, dict) else data
+    except json.JSONDecodeError:
+        # 响应被截断：逐个解析periods数组中完整的对象
+        items = []
+        start = text.find("[", max(text.find('"periods"'), 0))
+        decoder = json.JSONDecoder()
+        pos = start + 1 if start != -1 else len(text)
+        while pos < len(text):
+            while pos < len(text) and text[pos] in " \t\r\n,":
+                pos += 1
+            try:
+                item, pos = decoder.raw_decode(text, pos)
+            except json.JSONDecodeError:
+                break
+            items.append(item)
+
+    periods = {}
+    for i, item in enumerate(items if isinstance(items, list) else []):
+        if not isinstance(item, dict):
+            continue
+        # 优先按week_range对应，缺失时按顺序对应
+        week_range = normalize_week_range_or_none(str(item.get("week_range", "")))
+        if week_range not in week_ranges:
+            week_range = week_ranges[i] if i < len(week_ranges) else None
+        if week_range and week_range not in periods:
+            item["week_range"] = week_range
+            periods[week_range] = item
+    return periods
+
+
+def repair_plan_text(
+    text: str,
+    schema: Type[PlanModel],
+    model_client: ModelClient,
+    prompt_manager: PromptManager,
+    context: str,
+) -> str:
+    """校验模型输出的计划JSON，对未通过校验的片段发起修复
+
+    Returns:
+        通过校验时返回规范化后的JSON文本，无法修复时返回原文本
+    """
+    try:
+        plan = validate_plan(text, schema, model_client, prompt_manager, context)
+    except PlanValidationError as e:
+        logger.warning(f"Plan could not be repaired, keeping raw output: {e}")
+        return text
+    return json.dumps(plan.model_dump(), indent=2, ensure_ascii=False)
+
+
+def daily_repair_context(user_background: str, final_plan: str, week_range: str) -> str:
+    """构建修复日计划时的上下文：用户背景和对应双周的里程碑"""
+    context = f"用户背景：\n{user_background}\n\n需要细化的双周：{week_range}"
+    try:
+        plan = validate_plan(final_plan, OverallPlan)
+    except PlanValidationError:
+        return context
+    for milestone in plan.milestones:
+        if normalize_week_range_or_none(milestone.week_range) == week_range:
+            milestone_json = json.dumps(milestone.model_dump(), indent=2, ensure_ascii=False)
+            return f"{context}\n\n该双周的里程碑：\n{milestone_json}"
+    return context
+
+
+def save_daily_plan(daily_dir: str, week_range: str, daily_plan: str) -> str:
+    """保存单个双周的日计划（原始文本、JSON和Markdown格式）
+
+    Args:
+        daily_dir: 日计划输出目录
+        week_range: 双周范围，如"Week 1-2"
+        daily_plan: 大模型生成的日粒度计划
+
+    Returns:
+        原始日计划文件路径
+    """
+    os.makedirs(daily_dir, exist_ok=True)
+    filename = daily_plan_filename(week_range)
+    daily_plan_path = os.path.join(daily_dir, filename)
+    with open(daily_plan_path, "w", encoding="utf-8") as f:
+        f.write(daily_plan)
+    logger.info(f"Daily plan saved to {daily_plan_path}")
+
+    # 保存JSON和Markdown格式的每日计划
+    try:
+        # 按Schema解析JSON
+        daily_plan_model = validate_plan(daily_plan, DailyPlan)
+        # 保存JSON文件
+        daily_plan_json_path = os.path.join(daily_dir, filename.replace(".md", ".json"))
+        with open(daily_plan_json_path, "w", encoding="utf-8") as f:
+            json.dump(daily_plan_model.model_dump(), f, indent=2, ensure_ascii=False)
+        logger.info(f"Daily plan JSON saved to {daily_plan_json_path}")
+
+        # 生成并保存Markdown格式的每日计划
+        daily_plan_md = json_to_daily_markdown(daily_plan_model)
+        daily_plan_md_path = os.path.join(daily_dir, filename.replace(".md", "_markdown.md"))
+        with open(daily_plan_md_path, "w", encoding="utf-8") as f:
+            f.write(daily_plan_md)
+        logger.info(f"Daily plan Markdown saved to {daily_plan_md_path}")
+    except PlanValidationError as e:
+        logger.warning(f"Failed to parse daily plan for {week_range} as JSON: {e}")
+
+    return daily_plan_path
+
+
+def load_run_manifest(run_dir: str) -> Dict[str, Any]:
+    """加载运行清单，不存在时返回空字典"""
+    manifest_path = os.path.join(run_dir, RUN_MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_run_manifest(run_dir: str, manifest: Dict[str, Any]) -> str:
+    """写入运行清单，先写临时文件再替换，避免中途失败留下损坏的清单
+
+    Returns:
+        清单文件路径
+    """
+    os.makedirs(run_dir, exist_ok=True)
+    manifest_path = os.path.join(run_dir, RUN_MANIFEST_FILENAME)
+    manifest["updated_at"] = datetime.now().isoformat(timespec="seconds")
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, manifest_path)
+    logger.debug(f"Run manifest written to {manifest_path}")
+    return manifest_path
+
+
+def record_daily_plan(manifest: Dict[str, Any], week_range: str) -> None:
+    """在运行清单中记录某个双周日计划的生成情况"""
+    manifest.setdefault("daily_plans", {})[week_range] = {
+        "file": os.path.join("daily", daily_plan_filename(week_range)),
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def stop_daily_plans(deadline: Deadline) -> bool:
+    """剩余时间不足时不再开始新的双周"""
+    if deadline.below_fraction(settings.degrade_skip_daily_below_fraction):
+        logger.warning(f"Only {deadline.remaining():.0f}s left, stopping daily plan generation")
+        return True
+    return False
+
+
+def finish_daily_plans(state: PlanState, week_ranges: List[str], daily_plan_refs: Dict[str, str]) -> None:
+    """记录已生成的日计划，未生成的双周记为待生成"""
+    state.daily_plan_refs = daily_plan_refs
+    state.pending_periods = [w for w in week_ranges if w not in daily_plan_refs]
+    if state.pending_periods:
+        logger.warning(f"Daily plans pending: {', '.join(state.pending_periods)}")
+    logger.info(f"Generated {len(state.daily_plan_refs)} daily plans")
+
+
+def generate_daily_plans(state: PlanState, config: RunnableConfig) -> PlanState:
     """为每双周生成详细的日粒度计划"""
     logger.info("=== Entering generate_daily_plans node ===")
     try:
-        # 假设最终计划包含6个双周（共12周）
-        total_weeks = 6
+        week_ranges = get_week_ranges()
+        total_weeks = len(week_ranges)
         logger.info(f"Will generate daily plans for {total_weeks} bi-weekly periods")
         
-        state.daily_plans = {}
+        model_client, prompt_manager = get_run_resources(config, "generate_daily_plans")
+        store = get_artifact_store()
+        final_plan = store.get(state.final_plan_ref)
+        
+        daily_plan_refs = {}
         # 确保输出目录存在
         daily_dir = os.path.join(state.output_dir, "daily")
         os.makedirs(daily_dir, exist_ok=True)
         
-        for i in range(total_weeks):
-            week_start = i * 2 + 1
-            week_end = week_start + 1
-            week_range = f"Week {week_start}-{week_end}"
-            
-            logger.info(f"Generating daily plan for {week_range} ({i+1}/{total_weeks})...")
-            
-            logger.debug(f"Getting daily_plan prompt for {week_range}...")
-            # 获取每日计划prompt
-            prompt = state.prompt_manager.get_prompt(
-                "daily_plan",
-                user_background=state.user_background,
-                biweekly_plan=state.final_plan,
-                week_range=week_range
+        if settings.daily_batch_mode:
+            # 把多个双周合并到一次调用中，按输出token预算分批
+            daily_plans = generate_daily_plans_batched(
+                model_client, prompt_manager, state.user_background, final_plan, week_ranges
             )
-            
-            logger.debug(f"Calling model to generate daily plan for {week_range}...")
-            # 调用大模型生成日粒度计划
-            daily_plan = state.model_client.generate(prompt)
-            state.daily_plans[week_range] = daily_plan
-            logger.info(f"Daily plan for {week_range} generated successfully")
+        else:
+            daily_plans = (
+                (week_range, generate_daily_plan(
+                    model_client,
+                    prompt_manager,
+                    state.user_background,
+                    final_plan,
+                    week_range,
+                ))
+                for week_range in week_ranges
+            )
+        
+        # 剩余时间不足或超过截止时间时停止生成，余下的双周记为待生成，之后可用regenerate补齐
+        deadline = get_deadline(config)
+        daily_plans = iter(daily_plans)
+        while not stop_daily_plans(deadline):
+            try:
+                week_range, daily_plan = next(daily_plans)
+            except StopIteration:
+                break
+            except DeadlineExceeded as e:
+                logger.warning(f"Daily plan generation stopped: {e}")
+                break
+            daily_plan_refs[week_range] = store.put(daily_plan)
+            logger.info(f"Daily plan for {week_range} generated successfully ({len(daily_plan_refs)}/{total_weeks})")
             
             # 立即保存该双周的日计划
             logger.info(f"Saving daily plan for {week_range} immediately...")
-            # 将"Week 1-2"转换为"week1-2"
-            filename = week_range.lower().replace(" ", "") + ".md"
-            daily_plan_path = os.path.join(daily_dir, filename)
-            with open(daily_plan_path, "w", encoding="utf-8") as f:
-                f.write(daily_plan)
-            logger.info(f"Daily plan saved to {daily_plan_path}")
-            
-            # 保存JSON和Markdown格式的每日计划
-            try:
-                # 解析JSON
-                daily_plan_json = json.loads(daily_plan)
-                # 保存JSON文件
-                daily_plan_json_path = os.path.join(daily_dir, filename.replace(".md", ".json"))
-                with open(daily_plan_json_path, "w", encoding="utf-8") as f:
-                    json.dump(daily_plan_json, f, indent=2, ensure_ascii=False)
-                logger.info(f"Daily plan JSON saved to {daily_plan_json_path}")
-                
-                # 生成并保存Markdown格式的每日计划
-                daily_plan_md = json_to_daily_markdown(daily_plan_json)
-                daily_plan_md_path = os.path.join(daily_dir, filename.replace(".md", "_markdown.md"))
-                with open(daily_plan_md_path, "w", encoding="utf-8") as f:
-                    f.write(daily_plan_md)
-                logger.info(f"Daily plan Markdown saved to {daily_plan_md_path}")
-            except json.JSONDecodeError as e:
-                logger.warning(f"Failed to parse daily plan for {week_range} as JSON: {e}")
-        
-        logger.info(f"Generated {len(state.daily_plans)} daily plans")
+            save_daily_plan(daily_dir, week_range, daily_plan)
+        
+        finish_daily_plans(state, week_ranges, daily_plan_refs)
         logger.info("=== Exiting generate_daily_plans node ===")
         return state
     except Exception as e:
@@ -268,176 +927,140 @@ def generate_daily_plans(state: PlanState) -> PlanState:
         raise
 
 
-def json_to_markdown(json_data: dict) -> str:
+def _append_list(md_content: List[str], items: List[str]) -> None:
+    for item in items:
+        md_content.append(f"- {item}")
+
+
+def json_to_markdown(plan: Union[OverallPlan, dict]) -> str:
     """将JSON格式的学习计划转换为Markdown格式
     
     Args:
-        json_data: JSON格式的学习计划数据
+        plan: 学习计划，可以是OverallPlan或符合其Schema的字典
         
     Returns:
         Markdown格式的学习计划字符串
     """
+    if isinstance(plan, dict):
+        plan = OverallPlan.model_validate(plan)
     md_content = []
     
     # 添加标题
-    md_content.append(f"# {json_data.get('title', '学习计划')}")
+    md_content.append(f"# {plan.title or '学习计划'}")
     md_content.append("")
     
     # 添加概述
-    overview = json_data.get('overview', '')
-    if overview:
+    if plan.overview:
         md_content.append("## 计划概述")
-        md_content.append(overview)
+        md_content.append(plan.overview)
         md_content.append("")
     
     # 添加计划时长
-    duration = json_data.get('duration', '')
-    if duration:
-        md_content.append(f"**计划时长**: {duration}")
+    if plan.duration:
+        md_content.append(f"**计划时长**: {plan.duration}")
         md_content.append("")
     
     # 添加最终目标
-    final_goal = json_data.get('final_goal', '')
-    if final_goal:
+    if plan.final_goal:
         md_content.append("## 最终目标")
-        md_content.append(final_goal)
+        md_content.append(plan.final_goal)
         md_content.append("")
     
     # 添加成功标准
-    success_criteria = json_data.get('success_criteria', [])
-    if success_criteria:
+    if plan.success_criteria:
         md_content.append("## 成功标准")
-        if isinstance(success_criteria, list):
-            for criterion in success_criteria:
-                md_content.append(f"- {criterion}")
-        else:
-            md_content.append(success_criteria)
+        _append_list(md_content, plan.success_criteria)
         md_content.append("")
     
-    # 添加风险管理
-    risk_management = json_data.get('risk_notes', '')
-    if risk_management:
+    # 添加风险提示（最终计划使用risk_management，修正计划使用risk_notes）
+    risk_notes = plan.risk_notes or plan.risk_management
+    if risk_notes:
         md_content.append("## 风险提示")
-        md_content.append(risk_management)
+        md_content.append(risk_notes)
         md_content.append("")
     
     # 添加里程碑
-    milestones = json_data.get('milestones', [])
-    if milestones:
-        md_content.append("## 双周里程碑")
-        for milestone in milestones:
-            week_range = milestone.get('week_range', '未知')
-            md_content.append(f"### {week_range}")
-            
-            goal = milestone.get('goal', '')
-            if goal:
-                md_content.append(f"**目标**: {goal}")
-                md_content.append("")
-            
-            skills = milestone.get('skills', [])
-            if skills:
-                md_content.append("**需掌握技能**:")
-                if isinstance(skills, list):
-                    for skill in skills:
-                        md_content.append(f"- {skill}")
-                else:
-                    md_content.append(skills)
-                md_content.append("")
-            
-            projects = milestone.get('projects', [])
-            if projects:
-                md_content.append("**项目产出要求**:")
-                if isinstance(projects, list):
-                    for project in projects:
-                        md_content.append(f"- {project}")
-                else:
-                    md_content.append(projects)
-                md_content.append("")
-            
-            resources = milestone.get('resources', [])
-            if resources:
-                md_content.append("**推荐学习资源**:")
-                if isinstance(resources, list):
-                    for resource in resources:
-                        md_content.append(f"- {resource}")
-                else:
-                    md_content.append(resources)
-                md_content.append("")
+    md_content.append("## 双周里程碑")
+    for milestone in plan.milestones:
+        md_content.append(f"### {milestone.week_range}")
+        
+        if milestone.goal:
+            md_content.append(f"**目标**: {milestone.goal}")
+            md_content.append("")
+        
+        if milestone.skills:
+            md_content.append("**需掌握技能**:")
+            _append_list(md_content, milestone.skills)
+            md_content.append("")
+        
+        if milestone.projects:
+            md_content.append("**项目产出要求**:")
+            _append_list(md_content, milestone.projects)
+            md_content.append("")
+        
+        if milestone.resources:
+            md_content.append("**推荐学习资源**:")
+            _append_list(md_content, milestone.resources)
+            md_content.append("")
     
     return '\n'.join(md_content)
 
 
-def json_to_daily_markdown(json_data: dict) -> str:
+def json_to_daily_markdown(plan: Union[DailyPlan, dict]) -> str:
     """将JSON格式的每日计划转换为Markdown格式
     
     Args:
-        json_data: JSON格式的每日计划数据
+        plan: 每日计划，可以是DailyPlan或符合其Schema的字典
         
     Returns:
         Markdown格式的每日计划字符串
     """
+    if isinstance(plan, dict):
+        plan = DailyPlan.model_validate(plan)
     md_content = []
     
     # 添加标题
-    week_range = json_data.get('week_range', '未知')
-    md_content.append(f"# {week_range} 每日学习计划")
+    md_content.append(f"# {plan.week_range} 每日学习计划")
     md_content.append("")
     
     # 添加总时长
-    total_hours = json_data.get('total_hours', 0)
-    md_content.append(f"**总学习时长**: {total_hours} 小时")
+    md_content.append(f"**总学习时长**: {plan.total_hours:g} 小时")
     md_content.append("")
     
     # 添加每日计划
-    daily_schedule = json_data.get('daily_schedule', [])
-    if daily_schedule:
-        for day_schedule in daily_schedule:
-            day = day_schedule.get('day', '未知')
-            date = day_schedule.get('date', '')
-            md_content.append(f"## {day} {date}")
-            
-            # 添加当日总时长
-            day_total_hours = day_schedule.get('total_hours', 0)
-            md_content.append(f"**当日总时长**: {day_total_hours} 小时")
+    for day_schedule in plan.daily_schedule:
+        md_content.append(f"## {day_schedule.day} {day_schedule.date}")
+        
+        # 添加当日总时长
+        md_content.append(f"**当日总时长**: {day_schedule.total_hours:g} 小时")
+        md_content.append("")
+        
+        # 添加休息时间
+        if day_schedule.rest_time:
+            md_content.append(f"**休息时间安排**: {day_schedule.rest_time}")
+            md_content.append("")
+        
+        # 添加学习建议
+        if day_schedule.learning_tips:
+            md_content.append(f"**学习建议**: {day_schedule.learning_tips}")
+            md_content.append("")
+        
+        # 添加当日任务
+        md_content.append("### 当日任务")
+        for task in day_schedule.tasks:
+            md_content.append(f"#### {task.title} ({task.duration_hours:g}小时)")
+            if task.description:
+                md_content.append(f"**任务描述**: {task.description}")
+            if task.skills:
+                md_content.append(f"**涉及技能**: {', '.join(task.skills)}")
+            if task.expected_outcome:
+                md_content.append(f"**预期成果**: {task.expected_outcome}")
             md_content.append("")
-            
-            # 添加休息时间
-            rest_time = day_schedule.get('rest_time', '')
-            if rest_time:
-                md_content.append(f"**休息时间安排**: {rest_time}")
-                md_content.append("")
-            
-            # 添加学习建议
-            learning_tips = day_schedule.get('learning_tips', '')
-            if learning_tips:
-                md_content.append(f"**学习建议**: {learning_tips}")
-                md_content.append("")
-            
-            # 添加当日任务
-            tasks = day_schedule.get('tasks', [])
-            if tasks:
-                md_content.append("### 当日任务")
-                for task in tasks:
-                    title = task.get('title', '未知任务')
-                    duration = task.get('duration_hours', 0)
-                    description = task.get('description', '')
-                    skills = task.get('skills', [])
-                    expected_outcome = task.get('expected_outcome', '')
-                    
-                    md_content.append(f"#### {title} ({duration}小时)")
-                    if description:
-                        md_content.append(f"**任务描述**: {description}")
-                    if skills:
-                        md_content.append(f"**涉及技能**: {', '.join(skills)}")
-                    if expected_outcome:
-                        md_content.append(f"**预期成果**: {expected_outcome}")
-                    md_content.append("")
     
     # 添加双周总结
-    week_summary = json_data.get('week_summary', '')
-    if week_summary:
+    if plan.week_summary:
         md_content.append("## 双周学习总结和回顾建议")
-        md_content.append(week_summary)
+        md_content.append(plan.week_summary)
     
     return '\n'.join(md_content)
 
@@ -447,6 +1070,7 @@ def save_plans(state: PlanState) -> PlanState:
     logger.info("=== Entering save_plans node ===")
     try:
         logger.debug(f"Output directory: {state.output_dir}")
+        store = get_artifact_store()
         
         # 确保输出目录存在
         os.makedirs(state.output_dir, exist_ok=True)
@@ -458,20 +1082,35 @@ def save_plans(state: PlanState) -> PlanState:
         final_plan_path = os.path.join(state.output_dir, "overall_plan.md")
         logger.debug(f"Saving final plan to {final_plan_path}...")
         with open(final_plan_path, "w", encoding="utf-8") as f:
-            f.write(state.final_plan)
+            f.write(store.get(state.final_plan_ref))
         logger.info(f"Final plan saved to {final_plan_path}")
         
         # 保存每日计划
-        logger.info(f"Saving {len(state.daily_plans)} daily plans...")
-        for week_range, daily_plan in state.daily_plans.items():
-            # 将"Week 1-2"转换为"week1-2"
-            filename = week_range.lower().replace(" ", "") + ".md"
+        logger.info(f"Saving {len(state.daily_plan_refs)} daily plans...")
+        for week_range, daily_plan_ref in state.daily_plan_refs.items():
+            filename = daily_plan_filename(week_range)
             daily_plan_path = os.path.join(daily_dir, filename)
             logger.debug(f"Saving daily plan for {week_range} to {daily_plan_path}...")
             with open(daily_plan_path, "w", encoding="utf-8") as f:
-                f.write(daily_plan)
+                f.write(store.get(daily_plan_ref))
             logger.info(f"Daily plan for {week_range} saved to {daily_plan_path}")
         
+        # 保存运行清单，供后续单独重新生成某些双周的日计划
+        manifest = load_run_manifest(state.output_dir)
+        manifest.setdefault("created_at", datetime.now().isoformat(timespec="seconds"))
+        manifest.update({
+            "user_background": state.user_background,
+            "user_goal": state.user_goal,
+            "original_question": state.original_question,
+            "final_plan_file": "overall_plan.md",
+        })
+        for week_range in state.daily_plan_refs:
+            record_daily_plan(manifest, week_range)
+        manifest["pending_periods"] = state.pending_periods
+        manifest["degradations"] = state.degradations
+        manifest_path = write_run_manifest(state.output_dir, manifest)
+        logger.info(f"Run manifest saved to {manifest_path}")
+        
         logger.info("=== Exiting save_plans node ===")
         return state
     except Exception as e:
@@ -480,8 +1119,24 @@ def save_plans(state: PlanState) -> PlanState:
         raise
 
 
-def create_workflow() -> StateGraph:
-    """创建工作流图"""
+# 工作流节点，按执行顺序排列
+WORKFLOW_NODES = {
+    "generate_initial_plan": generate_initial_plan,
+    "critique_plan": critique_plan,
+    "compare_plans": compare_plans,
+    "generate_final_plan": generate_final_plan,
+    "generate_daily_plans": generate_daily_plans,
+    "save_plans": save_plans,
+}
+
+
+def create_workflow(nodes: Optional[Dict[str, Callable]] = None) -> StateGraph:
+    """创建工作流图
+    
+    Args:
+        nodes: 节点名称到节点函数的映射，默认使用同步节点WORKFLOW_NODES，
+            异步运行时传入async_workflow中的异步节点
+    """
     logger.info("=== Creating workflow graph ===")
     try:
         # 创建状态图
@@ -490,18 +1145,12 @@ def create_workflow() -> StateGraph:
         
         # 添加节点
         logger.debug("Adding nodes to workflow...")
-        workflow.add_node("init_clients", init_clients)
-        workflow.add_node("generate_initial_plan", generate_initial_plan)
-        workflow.add_node("critique_plan", critique_plan)
-        workflow.add_node("compare_plans", compare_plans)
-        workflow.add_node("generate_final_plan", generate_final_plan)
-        workflow.add_node("generate_daily_plans", generate_daily_plans)
-        workflow.add_node("save_plans", save_plans)
+        for name, node in (nodes or WORKFLOW_NODES).items():
+            workflow.add_node(name, node)
         
         # 添加边
         logger.debug("Adding edges to workflow...")
-        workflow.set_entry_point("init_clients")
-        workflow.add_edge("init_clients", "generate_initial_plan")
+        workflow.set_entry_point("generate_initial_plan")
         workflow.add_edge("generate_initial_plan", "critique_plan")
         workflow.add_edge("critique_plan", "compare_plans")
         workflow.add_edge("compare_plans", "generate_final_plan")
@@ -517,16 +1166,53 @@ def create_workflow() -> StateGraph:
         raise
 
 
-def run_workflow(user_background: str, user_goal: str, output_dir: str = None) -> Dict[str, Any]:
+def run_status(pending_periods: List[str], degradations: List[str]) -> str:
+    """根据待生成的双周和降级措施确定运行状态"""
+    if pending_periods:
+        return RUN_STATUS_PARTIAL
+    if degradations:
+        return RUN_STATUS_DEGRADED
+    return RUN_STATUS_COMPLETED
+
+
+def create_run_profiler() -> SamplingProfiler:
+    """创建按工作流节点归属样本、把模型调用计为网络等待的采样分析器"""
+    return SamplingProfiler(
+        phases={name: node.__code__ for name, node in WORKFLOW_NODES.items()},
+        network_functions=[ModelClient._invoke.__code__, ModelClient._invoke_coalesced.__code__],
+        ignored_thread_prefixes=[MONITOR_THREAD_NAME, HEARTBEAT_THREAD_PREFIX],
+        interval=settings.profile_interval_ms / 1000,
+    )
+
+
+def run_workflow(
+    user_background: str,
+    user_goal: str,
+    output_dir: str = None,
+    node_models: Optional[Dict[str, str]] = None,
+    deadline_seconds: Optional[float] = None,
+    profile: bool = False,
+    cancel_event: Optional[threading.Event] = None,
+) -> Dict[str, Any]:
     """运行工作流
     
     Args:
         user_background: 用户的技术背景介绍
         user_goal: 用户的学习目标
         output_dir: 输出目录，默认使用配置文件中的值
+        node_models: 按节点覆盖的模型配置，如{"compare_plans": "deepseek:deepseek-reasoner"}
+        deadline_seconds: 本次运行的时间预算（秒），默认使用配置文件中的值
+        profile: 是否采样分析本地计算开销，结果写入输出目录下的profile/
+        cancel_event: 设置后本次运行的模型调用按超时处理，用于worker失去租约时停止任务
         
     Returns:
-        包含生成计划的字典
+        包含最终状态的字典，其中计划文本为ArtifactStore引用，
+        另含本次运行期间的进程RSS峰值peak_rss_mb和增长rss_growth_mb，
+        按模型路由统计的调用指标model_metrics，运行状态run_status，
+        开启性能分析时另含按节点的耗时汇总profile
+        
+    Raises:
+        DeadlineExceeded: 生成最终计划之前就超过了截止时间
     """
     logger.info("=== Starting workflow execution ===")
     logger.debug(f"User background (first 100 chars): {user_background[:100]}...")
@@ -534,28 +1220,228 @@ def run_workflow(user_background: str, user_goal: str, output_dir: str = None) -
     logger.debug(f"Output directory: {output_dir or settings.output_dir}")
     
     try:
-        # 创建工作流
-        workflow = create_workflow()
-        logger.debug("Compiling workflow...")
-        app = workflow.compile()
-        
-        # 构建原始问题
-        logger.debug("Building original question...")
-        original_question = f"{user_background}\n{user_goal}\n- 严格遵循SMART原则（Specific/Measurable/Achievable/Relevant/Time-bound）\n- 分双周设置里程碑目标\n- 每个阶段包含可量化的技能掌握指标和项目产出要求"
-        logger.debug(f"Original question (first 200 chars): {original_question[:200]}...")
-        
-        # 运行工作流
-        logger.info("=== Invoking workflow ===")
-        result = app.invoke({
-            "user_background": user_background,
-            "user_goal": user_goal,
-            "original_question": original_question,
-            "output_dir": output_dir or settings.output_dir
-        })
+        # 开启性能分析时，从编译工作流图开始采样
+        profiler = create_run_profiler() if profile else None
+        with profiler or nullcontext():
+            # 创建工作流
+            workflow = create_workflow()
+            logger.debug("Compiling workflow...")
+            app = workflow.compile()
+        
+            # 客户端和管理器通过运行配置传给各节点，不放入状态
+            config = create_run_config(node_models, deadline_seconds, PromptManager(), cancel_event)
         
+            # 运行工作流
+            logger.info("=== Invoking workflow ===")
+            with PeakRSSMonitor() as rss_monitor:
+                result = app.invoke(
+                    initial_state(user_background, user_goal, output_dir), config=config
+                )
+        result = finish_run(result, config, rss_monitor, profiler)
         logger.info("=== Workflow execution completed successfully ===")
         return result
     except Exception as e:
         logger.error(f"Error running workflow: {e}")
         logger.exception("Full error traceback:")
         raise
+
+
+def initial_state(user_background: str, user_goal: str, output_dir: Optional[str]) -> Dict[str, Any]:
+    """构建工作流的初始状态"""
+    # 构建原始问题
+    logger.debug("Building original question...")
+    original_question = f"{user_background}\n{user_goal}\n- 严格遵循SMART原则（Specific/Measurable/Achievable/Relevant/Time-bound）\n- 分双周设置里程碑目标\n- 每个阶段包含可量化的技能掌握指标和项目产出要求"
+    logger.debug(f"Original question (first 200 chars): {original_question[:200]}...")
+    return {
+        "user_background": user_background,
+        "user_goal": user_goal,
+        "original_question": original_question,
+        "output_dir": output_dir or settings.output_dir
+    }
+
+
+def create_run_config(
+    node_models: Optional[Dict[str, str]],
+    deadline_seconds: Optional[float],
+    prompt_manager: PromptManager,
+    cancel_event: Optional[threading.Event] = None,
+) -> RunnableConfig:
+    """构建运行配置：模型路由、prompt管理器和截止时间（cancel_event设置后视为超时）"""
+    logger.debug("Creating ModelRouter and PromptManager instances...")
+    deadline = Deadline(
+        deadline_seconds if deadline_seconds is not None else settings.run_deadline_seconds, cancel_event
+    )
+    return {
+        "configurable": {
+            "model_router": ModelRouter(node_models, deadline),
+            "prompt_manager": prompt_manager,
+            "deadline": deadline,
+        }
+    }
+
+
+def finish_run(
+    result: Dict[str, Any],
+    config: RunnableConfig,
+    rss_monitor: Optional[PeakRSSMonitor] = None,
+    profiler: Optional[SamplingProfiler] = None,
+) -> Dict[str, Any]:
+    """汇总运行指标和状态，记录到运行清单中
+
+    Args:
+        result: 工作流的最终状态
+        config: 运行配置
+        rss_monitor: 内存峰值采样器，为空时不记录内存指标
+        profiler: 采样分析器，为空时不记录性能分析结果
+
+    Returns:
+        补充了内存指标、模型调用指标、运行状态（以及性能分析汇总）的运行结果
+    """
+    model_router = config["configurable"]["model_router"]
+    result = dict(result)
+    result["peak_rss_mb"] = rss_monitor.peak_rss_mb if rss_monitor is not None else None
+    result["rss_growth_mb"] = rss_monitor.rss_growth_mb if rss_monitor is not None else None
+    result["model_metrics"] = model_router.metrics_summary()
+    result["run_status"] = run_status(result["pending_periods"], result["degradations"])
+    for route, metrics in result["model_metrics"].items():
+        logger.info(
+            f"Model route {route}: {metrics['calls']} calls ({metrics['coalesced_calls']} coalesced), "
+            f"avg latency {metrics['avg_latency_seconds']}s, nodes {', '.join(metrics['nodes'])}"
+        )
+    
+    # 在运行清单中记录运行状态和内存指标
+    manifest = load_run_manifest(result["output_dir"])
+    manifest["status"] = result["run_status"]
+    manifest["metrics"] = {
+        "peak_rss_mb": result["peak_rss_mb"],
+        "rss_growth_mb": result["rss_growth_mb"],
+        "model_routes": result["model_metrics"],
+    }
+    if profiler is not None:
+        result["profile"] = profiler.summary()
+        profiler.save(os.path.join(result["output_dir"], PROFILE_DIRNAME))
+        manifest["metrics"]["profile"] = {
+            node: {k: v for k, v in item.items() if k != "hotspots"}
+            for node, item in result["profile"].items()
+        }
+    write_run_manifest(result["output_dir"], manifest)
+    
+    if result["run_status"] != RUN_STATUS_COMPLETED:
+        logger.warning(
+            f"Workflow finished with status {result['run_status']}, "
+            f"degradations: {result['degradations']}, pending periods: {result['pending_periods']}"
+        )
+    return result
+    
+
+def regenerate_daily_plans(
+    run_dir: str,
+    week_ranges: Optional[List[str]] = None,
+    user_background: Optional[str] = None,
+    max_workers: Optional[int] = None,
+    node_models: Optional[Dict[str, str]] = None,
+) -> Dict[str, str]:
+    """基于已有的输出目录，只重新生成指定双周的日计划
+
+    从运行目录中加载已保存的总计划和用户背景，重新生成指定的双周日计划，
+    多个双周时并行生成，并就地更新日计划文件和运行清单。
+
+    Args:
+        run_dir: 已有的输出目录（包含overall_plan.md）
+        week_ranges: 需要重新生成的双周范围，如["Week 5-6"]，为None时补齐运行清单中待生成的双周
+        user_background: 用户的技术背景介绍，默认从运行清单中读取
+        max_workers: 并行生成的最大线程数，默认与双周数量相同
+        node_models: 按节点覆盖的模型配置，日计划使用generate_daily_plans节点的配置
+
+    Returns:
+        双周范围到新生成日计划的字典，补齐待生成的双周但没有待生成的双周时为空
+
+    Raises:
+        ValueError: 未指定双周、双周不在总计划中，或找不到用户背景
+    """
+    logger.info("=== Starting daily plan regeneration ===")
+    try:
+        manifest = load_run_manifest(run_dir)
+        if week_ranges is None:
+            week_ranges = manifest.get("pending_periods", [])
+            if not week_ranges:
+                logger.info(f"No pending daily plans in {run_dir}, nothing to regenerate")
+                return {}
+        week_ranges = list(dict.fromkeys(normalize_week_range(w) for w in week_ranges))
+        if not week_ranges:
+            raise ValueError("No week ranges given to regenerate")
+
+        final_plan_path = os.path.join(run_dir, "overall_plan.md")
+        if not os.path.exists(final_plan_path):
+            raise FileNotFoundError(f"Final plan not found: {final_plan_path}")
+        with open(final_plan_path, "r", encoding="utf-8") as f:
+            final_plan = f.read()
+
+        # 只允许总计划中存在的双周，避免凭空生成不存在的日计划文件
+        valid_ranges = plan_week_ranges(final_plan)
+        unknown = [w for w in week_ranges if w not in valid_ranges]
+        if unknown:
+            raise ValueError(
+                f"Week ranges not in the overall plan: {', '.join(unknown)}. "
+                f"Valid ranges: {', '.join(valid_ranges)}"
+            )
+
+        user_background = user_background or manifest.get("user_background")
+        if not user_background:
+            raise ValueError(
+                f"No user background found in {run_dir}/{RUN_MANIFEST_FILENAME}, "
+                "please provide it explicitly"
+            )
+
+        logger.info(f"Regenerating daily plans in {run_dir}: {', '.join(week_ranges)}")
+        model_client = ModelRouter(node_models).client_for("generate_daily_plans")
+        prompt_manager = PromptManager()
+        daily_dir = os.path.join(run_dir, "daily")
+
+        def regenerate(week_range: str) -> str:
+            logger.info(f"Regenerating daily plan for {week_range}...")
+            daily_plan = generate_daily_plan(
+                model_client, prompt_manager, user_background, final_plan, week_range
+            )
+            save_daily_plan(daily_dir, week_range, daily_plan)
+            logger.info(f"Daily plan for {week_range} regenerated successfully")
+            return daily_plan
+
+        # 多个双周时并行生成
+        workers = max_workers or len(week_ranges)
+        daily_plans: Dict[str, str] = {}
+        errors: Dict[str, Exception] = {}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(regenerate, week_range): week_range for week_range in week_ranges}
+            for future in as_completed(futures):
+                week_range = futures[future]
+                try:
+                    daily_plans[week_range] = future.result()
+                except Exception as e:
+                    errors[week_range] = e
+                    logger.error(f"Failed to regenerate daily plan for {week_range}: {e}")
+
+        # 就地更新运行清单，部分双周失败时也记录已经覆盖了文件的双周
+        regenerated = [w for w in week_ranges if w in daily_plans]
+        manifest["user_background"] = user_background
+        for week_range in regenerated:
+            record_daily_plan(manifest, week_range)
+        if "pending_periods" in manifest:
+            manifest["pending_periods"] = [
+                w for w in manifest["pending_periods"] if w not in regenerated
+            ]
+            if not manifest["pending_periods"] and manifest.get("status") == RUN_STATUS_PARTIAL:
+                manifest["status"] = RUN_STATUS_DEGRADED if manifest.get("degradations") else RUN_STATUS_COMPLETED
+        write_run_manifest(run_dir, manifest)
+
+        if errors:
+            failed = [w for w in week_ranges if w in errors]
+            logger.error(f"Daily plans failed to regenerate: {', '.join(failed)}")
+            raise errors[failed[0]]
+
+        logger.info("=== Daily plan regeneration completed successfully ===")
+        return {w: daily_plans[w] for w in week_ranges}
+    except Exception as e:
+        logger.error(f"Error regenerating daily plans: {e}")
+        logger.exception("Full error traceback:")
+        raise
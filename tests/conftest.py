@@ -0,0 +1,8 @@
+import os
+import tempfile
+
+# 导入src前设置必填配置，测试不访问真实的模型平台
+os.environ.setdefault("API_KEY", "test-key")
+os.environ.setdefault("DEEPSEEK_API_BASE", "http://127.0.0.1:9")
+os.environ.setdefault("LOG_TO_FILE", "false")
+os.environ.setdefault("LOG_DIR", os.path.join(tempfile.gettempdir(), "planer-test-logs"))
@@ -0,0 +1,57 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from src.artifact_store import ArtifactStore
+
+
+def test_spilled_artifacts_are_reloaded(tmp_path):
+    store = ArtifactStore(cache_dir=str(tmp_path), max_memory_bytes=10)
+    first = store.put("a" * 8)
+    second = store.put("b" * 8)
+
+    # 超过内存上限，最久未使用的文本落盘
+    assert store.memory_bytes == 8
+    assert store.get(first) == "a" * 8
+    assert store.get(second) == "b" * 8
+
+
+def test_async_access_matches_sync(tmp_path):
+    store = ArtifactStore(cache_dir=str(tmp_path), max_memory_bytes=10)
+
+    async def main():
+        first = await store.aput("a" * 8)
+        second = await store.aput("b" * 8)
+        return first, second, await store.aget(first), await store.aget(second)
+
+    first, second, first_text, second_text = asyncio.run(main())
+    assert first_text == "a" * 8
+    assert second_text == "b" * 8
+    assert store.get(first) == "a" * 8
+
+
+def test_cleanup_removes_only_expired_artifacts(tmp_path):
+    store = ArtifactStore(cache_dir=str(tmp_path), max_memory_bytes=0, ttl_seconds=3600)
+    old = store.put("old text")
+    recent = store.put("recent text")
+    old_path = store._path(store._digest(old))
+    expired = time.time() - 7200
+    os.utime(old_path, (expired, expired))
+
+    assert store.cleanup() == 1
+    with pytest.raises(KeyError):
+        store.get(old)
+    assert store.get(recent) == "recent text"
+
+
+def test_access_refreshes_artifact_age(tmp_path):
+    store = ArtifactStore(cache_dir=str(tmp_path), max_memory_bytes=0, ttl_seconds=3600)
+    ref = store.put("text")
+    path = store._path(store._digest(ref))
+    expired = time.time() - 7200
+    os.utime(path, (expired, expired))
+
+    assert store.get(ref) == "text"
+    assert store.cleanup() == 0
@@ -0,0 +1,99 @@
+import time
+
+from src.config import settings
+from src.deadline import Deadline
+from src.workflow import (
+    CANDIDATE_LABELS,
+    SINGLE_PLAN_COMPARISON,
+    SKIPPED_COMPARISON,
+    PlanState,
+    advance_winners,
+    skip_comparison,
+    skipped_comparison_text,
+    tournament_groups,
+)
+
+
+def make_state(candidates):
+    return PlanState(
+        user_background="b",
+        user_goal="g",
+        original_question="q",
+        revised_plan_refs=[f"ref-{i}" for i in range(candidates)],
+    )
+
+
+def test_single_candidate_skips_comparison_without_degrading():
+    state = make_state(1)
+    assert skip_comparison(state, Deadline())
+    assert state.degradations == []
+    assert skipped_comparison_text(state) == SINGLE_PLAN_COMPARISON
+
+
+def test_low_remaining_time_skips_comparison_as_degradation():
+    state = make_state(3)
+    deadline = Deadline(1)
+    deadline.expires_at = time.monotonic() + 0.1
+    assert skip_comparison(state, deadline)
+    assert state.degradations == ["compare_plans=skipped"]
+    assert skipped_comparison_text(state) == SKIPPED_COMPARISON
+
+
+def test_comparison_runs_with_enough_time():
+    state = make_state(3)
+    assert not skip_comparison(state, Deadline(100))
+    assert not skip_comparison(state, Deadline())
+    assert state.degradations == []
+
+
+def test_tournament_groups_with_byes(monkeypatch):
+    monkeypatch.setattr(settings, "compare_group_size", 3)
+    monkeypatch.setattr(settings, "compare_top_candidates", 2)
+
+    assert tournament_groups(list(range(7))) == [[0, 3, 6], [1, 4], [2, 5]]
+    # 最后一轮分组数不少于晋级数量，不足两份的组轮空晋级
+    assert tournament_groups([6, 4, 5]) == [[6, 5], [4]]
+
+
+def test_tournament_of_seven_keeps_top_two(monkeypatch):
+    monkeypatch.setattr(settings, "compare_group_size", 3)
+    monkeypatch.setattr(settings, "compare_top_candidates", 2)
+    pool = list(range(7))
+    notes = []
+    rounds = 0
+    while len(pool) > 2:
+        rounds += 1
+        groups = tournament_groups(pool)
+        # 每组都由序号最大的计划胜出
+        comparisons = [
+            f"## 3. 最终结论\n- **最佳答案**：{CANDIDATE_LABELS[max(g)]}\n- **核心理由**：更完整" if len(g) > 1 else None
+            for g in groups
+        ]
+        pool, round_notes = advance_winners(rounds, groups, comparisons)
+        notes.extend(round_notes)
+
+    assert rounds == 2
+    # 第二轮E轮空晋级
+    assert pool == [6, 4]
+    assert notes[0] == "- 第1轮 A/D/G：计划G胜出。理由：更完整"
+    assert len(notes) == 4
+
+
+def test_advance_winners_parses_best_answer():
+    groups = [[0, 1], [2, 3], [4, 5], [6]]
+    comparisons = [
+        "前文提到计划A。\n## 3. 最终结论\n- **最佳答案**：计划B\n- **核心理由**：结构清晰",
+        # 组外的标签被忽略，取组内最后出现的标签
+        "- **最佳答案**：D\n- **最佳答案**：Z",
+        # 无法解析时晋级组内第一份计划
+        "没有结论",
+        None,
+    ]
+    winners, notes = advance_winners(1, groups, comparisons)
+
+    assert winners == [1, 3, 4, 6]
+    assert notes == [
+        "- 第1轮 A/B：计划B胜出。理由：结构清晰",
+        "- 第1轮 C/D：计划D胜出。",
+        "- 第1轮 E/F：计划E胜出。",
+    ]
@@ -0,0 +1,96 @@
+import json
+from types import SimpleNamespace
+
+from src.config import settings
+from src.model_client import ModelClient
+from src.workflow import DailyBatchPlanner, estimate_period_tokens, split_batch_response
+
+WEEKS = ["Week 1-2", "Week 3-4", "Week 5-6"]
+
+
+def period(week_range, **overrides):
+    item = {"week_range": week_range, "total_hours": 80, "daily_schedule": [{"day": "Day 1"}]}
+    item.update(overrides)
+    return item
+
+
+def message(content="", finish_reason="stop", output_tokens=None):
+    usage = {"output_tokens": output_tokens} if output_tokens is not None else None
+    return SimpleNamespace(
+        content=content, response_metadata={"finish_reason": finish_reason}, usage_metadata=usage
+    )
+
+
+def test_split_fenced_json():
+    text = "```json\n" + json.dumps({"periods": [period(w) for w in WEEKS]}) + "\n```"
+    periods = split_batch_response(text, WEEKS)
+    assert list(periods) == WEEKS
+    assert periods["Week 3-4"]["total_hours"] == 80
+
+
+def test_split_truncated_response_keeps_complete_periods():
+    text = json.dumps({"periods": [period(w) for w in WEEKS]})
+    cut = text.rfind('{"week_range"') + 30
+    periods = split_batch_response(text[:cut], WEEKS)
+    assert list(periods) == WEEKS[:2]
+
+
+def test_split_truncated_inside_first_period():
+    text = json.dumps({"periods": [period(w) for w in WEEKS]})
+    assert split_batch_response(text[:40], WEEKS) == {}
+
+
+def test_split_matches_labels_then_positions():
+    items = [period("week3 - 4", total_hours=1), period("Week 1-2", total_hours=2), period("Week 99-100", total_hours=3)]
+    periods = split_batch_response(json.dumps({"periods": items}), WEEKS)
+    # 能识别的week_range按标签对应，错误的标签按位置对应
+    assert {w: p["total_hours"] for w, p in periods.items()} == {"Week 3-4": 1, "Week 1-2": 2, "Week 5-6": 3}
+    assert periods["Week 3-4"]["week_range"] == "Week 3-4"
+    assert periods["Week 5-6"]["week_range"] == "Week 5-6"
+
+
+def test_split_missing_labels_fall_back_to_positions():
+    items = [period(w) for w in WEEKS]
+    for item in items:
+        del item["week_range"]
+    periods = split_batch_response(json.dumps(items), WEEKS)
+    assert [p["week_range"] for p in periods.values()] == WEEKS
+
+
+def test_split_does_not_overwrite_period_already_matched():
+    items = [period("Week 3-4", total_hours=1), period("", total_hours=2)]
+    periods = split_batch_response(json.dumps({"periods": items}), WEEKS)
+    # 第二项按位置对应Week 3-4，但该双周已有结果
+    assert list(periods) == ["Week 3-4"]
+    assert periods["Week 3-4"]["total_hours"] == 1
+
+
+def test_estimate_period_tokens_after_truncation():
+    truncated = message(finish_reason="length", output_tokens=3000)
+    assert estimate_period_tokens(1000, 3000, truncated, 2) == 1501
+    # 一个双周都没有完整输出时，估计值超过预算，之后每批只含一个双周
+    assert estimate_period_tokens(1000, 3000, truncated, 0) == 3001
+
+
+def test_estimate_period_tokens_from_usage():
+    assert estimate_period_tokens(1000, 3000, message(output_tokens=2000), 2) == 1100
+    assert estimate_period_tokens(1000, 3000, message(), 2) == 1000
+    assert estimate_period_tokens(1000, 3000, message(output_tokens=2000), 0) == 1000
+
+
+def test_planner_batches_by_budget(monkeypatch):
+    monkeypatch.setattr(settings, "daily_batch_output_tokens", 3000)
+    monkeypatch.setattr(settings, "daily_period_output_tokens", 1000)
+    weeks = [f"Week {2 * i + 1}-{2 * i + 2}" for i in range(7)]
+    planner = DailyBatchPlanner(ModelClient("deepseek", "deepseek-chat", "test-key"), None, "bg", "plan", weeks)
+
+    first = planner.next_batch()
+    assert first == weeks[:3]
+    content = json.dumps({"periods": [period(w) for w in first[:2]]})
+    reply = message(content, finish_reason="length", output_tokens=3000)
+    assert [w for w, _, _ in planner.periods(first, reply)] == first[:2]
+    planner.finish_batch(first, reply, first[:2])
+
+    # 截断后估计值变为1501，每批只含一个双周，全部改为单独生成
+    assert planner.next_batch() is None
+    assert planner.retry_individually == [weeks[2]] + weeks[3:]
@@ -0,0 +1,31 @@
+import time
+
+import pytest
+
+from src.deadline import Deadline, DeadlineExceeded
+
+
+def test_unlimited_deadline_never_degrades():
+    deadline = Deadline()
+    assert deadline.remaining() is None
+    assert not deadline.expired
+    assert not deadline.below(10)
+    assert not deadline.below_fraction(0.5)
+    deadline.check()
+
+
+def test_below_fraction_scales_with_budget():
+    # 预算100秒时剩余时间远多于一半，不应降级
+    deadline = Deadline(100)
+    assert not deadline.below_fraction(0.5)
+    assert not deadline.below_fraction(None)
+    assert deadline.below_fraction(1.01)
+
+
+def test_check_raises_after_expiry():
+    deadline = Deadline(0.01)
+    time.sleep(0.02)
+    assert deadline.expired
+    assert deadline.below_fraction(0.05)
+    with pytest.raises(DeadlineExceeded):
+        deadline.check("calling model")
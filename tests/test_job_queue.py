@@ -0,0 +1,134 @@
+import os
+import sqlite3
+import time
+
+import pytest
+
+from src import worker as worker_module
+from src.config import settings
+from src.job_queue import JobStatus, SQLiteJobQueue
+from src.worker import Worker
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return SQLiteJobQueue(str(tmp_path / "jobs.db"))
+
+
+def expire_lease(queue, job_id):
+    """模拟worker崩溃：把任务的租约改为已过期"""
+    with sqlite3.connect(queue.path) as conn:
+        conn.execute("UPDATE jobs SET lease_expires_at = ? WHERE id = ?", (time.time() - 1, job_id))
+
+
+def test_claim_is_exclusive_while_lease_is_live(queue):
+    job_id = queue.enqueue({"n": 1})
+    job = queue.claim("worker-a", lease_seconds=60)
+
+    assert job.id == job_id
+    assert job.status == JobStatus.RUNNING
+    assert job.lease_owner == "worker-a"
+    assert job.attempts == 1
+    assert queue.claim("worker-b", lease_seconds=60) is None
+
+
+def test_expired_lease_is_reclaimed(queue):
+    job_id = queue.enqueue({"n": 1})
+    queue.claim("worker-a", lease_seconds=60)
+    expire_lease(queue, job_id)
+
+    job = queue.claim("worker-b", lease_seconds=60)
+    assert job.id == job_id
+    assert job.lease_owner == "worker-b"
+    assert job.attempts == 2
+
+
+def test_expired_lease_without_attempts_left_goes_dead(queue):
+    job_id = queue.enqueue({"n": 1}, max_attempts=1)
+    queue.claim("worker-a", lease_seconds=60)
+    expire_lease(queue, job_id)
+
+    assert queue.claim("worker-b", lease_seconds=60) is None
+    assert queue.get(job_id).status == JobStatus.DEAD
+
+
+def test_fail_backs_off_then_moves_to_dead(queue):
+    job_id = queue.enqueue({"n": 1}, max_attempts=2)
+    queue.claim("worker-a")
+    before = time.time()
+    assert queue.fail(job_id, "worker-a", "boom") == JobStatus.PENDING
+
+    job = queue.get(job_id)
+    assert job.error == "boom"
+    assert job.lease_owner is None
+    assert job.available_at >= before + settings.job_retry_backoff_seconds
+    # 退避期间不会被领取
+    assert queue.claim("worker-a") is None
+
+    with sqlite3.connect(queue.path) as conn:
+        conn.execute("UPDATE jobs SET available_at = ? WHERE id = ?", (time.time() - 1, job_id))
+    assert queue.claim("worker-b").attempts == 2
+    assert queue.fail(job_id, "worker-b", "boom again") == JobStatus.DEAD
+    assert queue.get(job_id).status == JobStatus.DEAD
+    assert queue.claim("worker-b") is None
+
+
+def test_old_owner_cannot_heartbeat_complete_or_fail(queue):
+    job_id = queue.enqueue({"n": 1})
+    queue.claim("worker-a", lease_seconds=60)
+    expire_lease(queue, job_id)
+    queue.claim("worker-b", lease_seconds=60)
+
+    assert not queue.heartbeat(job_id, "worker-a")
+    assert not queue.complete(job_id, "worker-a", {"ok": True})
+    assert queue.fail(job_id, "worker-a", "boom") is None
+    assert queue.heartbeat(job_id, "worker-b")
+    assert queue.complete(job_id, "worker-b", {"ok": True})
+    assert queue.get(job_id).status == JobStatus.SUCCEEDED
+
+
+def test_process_discards_output_when_lease_is_lost(queue, tmp_path, monkeypatch):
+    output_dir = str(tmp_path / "out")
+    job_id = queue.enqueue({"output_dir": output_dir})
+    worker = Worker(queue, worker_id="worker-a", lease_seconds=60, heartbeat_seconds=0.05)
+    job = queue.claim(worker.worker_id, worker.lease_seconds)
+    staging_dirs = []
+
+    def fake_run_job(job, profile, staging_dir, cancel_event):
+        staging_dirs.append(staging_dir)
+        os.makedirs(staging_dir)
+        with open(os.path.join(staging_dir, "overall_plan.md"), "w", encoding="utf-8") as f:
+            f.write("plan")
+        # 另一个worker接手了租约，续租失败后本任务被要求停止
+        expire_lease(queue, job.id)
+        queue.claim("worker-b", lease_seconds=60)
+        assert cancel_event.wait(5)
+        return {"output_dir": staging_dir}
+
+    monkeypatch.setattr(worker_module, "run_job", fake_run_job)
+    assert worker.process(job) == JobStatus.RUNNING
+
+    assert not os.path.exists(output_dir)
+    assert not os.path.exists(staging_dirs[0])
+    job = queue.get(job_id)
+    assert job.status == JobStatus.RUNNING
+    assert job.lease_owner == "worker-b"
+
+
+def test_process_publishes_output_on_success(queue, tmp_path, monkeypatch):
+    output_dir = str(tmp_path / "out")
+    job_id = queue.enqueue({"output_dir": output_dir})
+    worker = Worker(queue, worker_id="worker-a", lease_seconds=60, heartbeat_seconds=0.05)
+    job = queue.claim(worker.worker_id, worker.lease_seconds)
+
+    def fake_run_job(job, profile, staging_dir, cancel_event):
+        os.makedirs(staging_dir)
+        with open(os.path.join(staging_dir, "overall_plan.md"), "w", encoding="utf-8") as f:
+            f.write("plan")
+        return {"output_dir": staging_dir}
+
+    monkeypatch.setattr(worker_module, "run_job", fake_run_job)
+    assert worker.process(job) == JobStatus.SUCCEEDED
+
+    assert os.listdir(output_dir) == ["overall_plan.md"]
+    assert queue.get(job_id).result["output_dir"] == output_dir
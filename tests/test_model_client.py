@@ -0,0 +1,12 @@
+from src.model_client import ModelClient
+
+
+def test_limit_output_tokens_caps_known_models():
+    client = ModelClient("deepseek", "deepseek-chat", "test-key")
+    assert client.limit_output_tokens(16000) == 8192
+    assert client.limit_output_tokens(4000) == 4000
+
+
+def test_limit_output_tokens_keeps_unknown_models():
+    client = ModelClient("deepseek", "deepseek-custom", "test-key")
+    assert client.limit_output_tokens(16000) == 16000
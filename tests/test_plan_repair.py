@@ -0,0 +1,156 @@
+import asyncio
+import json
+import re
+
+import pytest
+
+from src.deadline import DeadlineExceeded
+from src.plan_repair import (
+    PlanValidationError,
+    _fragment_path,
+    _fragment_schema,
+    _set_at,
+    avalidate_plan,
+    validate_plan,
+)
+from src.prompt_manager import PromptManager
+from src.schemas import DailyPlan, OverallPlan
+
+
+def overall_plan(**overrides):
+    plan = {
+        "title": "T",
+        "milestones": [
+            {"week_range": f"Week {2 * i + 1}-{2 * i + 2}", "goal": "g", "skills": ["s"], "projects": ["p"]}
+            for i in range(2)
+        ],
+        "final_goal": "f",
+    }
+    plan.update(overrides)
+    return plan
+
+
+class RepairClient:
+    """模拟的修复模型：按片段路径返回预设的输出，值为异常时抛出"""
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.calls = []
+
+    def generate(self, prompt):
+        path = re.search(r"位于 `([^`]+)` 的片段", prompt).group(1)
+        self.calls.append(path)
+        response = self.responses[path]
+        if isinstance(response, list):
+            response = response.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    async def agenerate(self, prompt):
+        return self.generate(prompt)
+
+
+def test_fragment_path_groups_errors_by_list_item():
+    assert _fragment_path(("milestones", 1, "goal")) == ("milestones", 1)
+    assert _fragment_path(("daily_schedule", 0, "tasks", 2, "duration_hours")) == ("daily_schedule", 0)
+    assert _fragment_path(("final_goal",)) == ("final_goal",)
+
+
+def test_fragment_schema_and_set_at():
+    schema = _fragment_schema(OverallPlan, ("milestones", 0))
+    assert {"week_range", "goal", "skills", "projects"} <= set(schema["required"])
+    assert "$ref" not in json.dumps(schema)
+    assert _fragment_schema(DailyPlan, ("daily_schedule", 0))["properties"]["tasks"]["items"]["properties"]
+
+    data = overall_plan()
+    _set_at(data, ("milestones", 1), {"goal": "new"})
+    assert data["milestones"][1] == {"goal": "new"}
+    assert data["milestones"][0]["goal"] == "g"
+
+
+def test_repairs_only_the_invalid_milestone():
+    plan = overall_plan()
+    del plan["milestones"][1]["goal"]
+    repaired = dict(overall_plan()["milestones"][1], goal="fixed")
+    client = RepairClient({"milestones[1]": json.dumps(repaired)})
+
+    result = validate_plan(json.dumps(plan), OverallPlan, client, PromptManager())
+    assert client.calls == ["milestones[1]"]
+    assert result.milestones[1].goal == "fixed"
+    assert result.milestones[0].goal == "g"
+
+
+def test_async_validation_repairs_like_sync():
+    plan = overall_plan()
+    del plan["milestones"][1]["goal"]
+    del plan["final_goal"]
+    repaired = dict(overall_plan()["milestones"][1], goal="fixed")
+    client = RepairClient({"milestones[1]": ["not json", json.dumps(repaired)], "final_goal": '"f"'})
+
+    result = asyncio.run(avalidate_plan(json.dumps(plan), OverallPlan, client, PromptManager(), max_rounds=2))
+    assert sorted(client.calls) == ["final_goal", "milestones[1]", "milestones[1]"]
+    assert result.milestones[1].goal == "fixed"
+    assert result.final_goal == "f"
+
+
+def test_repairs_missing_top_level_field():
+    plan = overall_plan()
+    del plan["final_goal"]
+    client = RepairClient({"final_goal": '"f"'})
+
+    result = validate_plan(json.dumps(plan), OverallPlan, client, PromptManager())
+    assert client.calls == ["final_goal"]
+    assert result.final_goal == "f"
+    assert result.title == "T"
+
+
+def test_invalid_repair_json_is_retried_next_round():
+    plan = overall_plan()
+    del plan["milestones"][0]["skills"]
+    del plan["final_goal"]
+    repaired = dict(overall_plan()["milestones"][0])
+    client = RepairClient({"milestones[0]": ["not json", json.dumps(repaired)], "final_goal": '"f"'})
+
+    result = validate_plan(json.dumps(plan), OverallPlan, client, PromptManager(), max_rounds=2)
+    # 第二轮只重新修复仍未通过校验的片段
+    assert sorted(client.calls) == ["final_goal", "milestones[0]", "milestones[0]"]
+    assert result.milestones[0].skills == ["s"]
+
+
+def test_gives_up_after_max_rounds():
+    plan = overall_plan()
+    del plan["final_goal"]
+    client = RepairClient({"final_goal": ["not json"] * 5})
+
+    with pytest.raises(PlanValidationError, match="after 2 repair rounds"):
+        validate_plan(json.dumps(plan), OverallPlan, client, PromptManager(), max_rounds=2)
+    assert client.calls == ["final_goal", "final_goal"]
+
+
+def test_validation_without_client_does_not_repair():
+    with pytest.raises(PlanValidationError, match="after 0 repair rounds"):
+        validate_plan(json.dumps({"title": "T"}), OverallPlan)
+    with pytest.raises(PlanValidationError, match="not valid JSON"):
+        validate_plan("not json", OverallPlan)
+
+
+def test_failed_repair_call_keeps_fragment_and_retries():
+    plan = overall_plan()
+    del plan["final_goal"]
+    client = RepairClient({"final_goal": [ConnectionError("503"), '"f"']})
+
+    result = validate_plan(json.dumps(plan), OverallPlan, client, PromptManager(), max_rounds=2)
+    assert result.final_goal == "f"
+    assert client.calls == ["final_goal", "final_goal"]
+
+
+def test_repair_stops_when_deadline_exceeded():
+    plan = overall_plan()
+    del plan["final_goal"]
+    client = RepairClient({"final_goal": DeadlineExceeded("deadline exceeded")})
+
+    with pytest.raises(PlanValidationError):
+        validate_plan(json.dumps(plan), OverallPlan, client, PromptManager(), max_rounds=3)
+    # 超过截止时间后不再发起后续轮次的修复
+    assert client.calls == ["final_goal"]
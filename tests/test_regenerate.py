@@ -0,0 +1,98 @@
+import json
+import os
+
+import pytest
+from typer.testing import CliRunner
+
+from src import workflow
+from src.cli import app
+from src.workflow import (
+    load_run_manifest,
+    normalize_week_range,
+    normalize_week_range_or_none,
+    regenerate_daily_plans,
+    write_run_manifest,
+)
+
+
+def test_normalize_week_range():
+    assert normalize_week_range("week5-6") == "Week 5-6"
+    assert normalize_week_range(" Week 5 - 6 ") == "Week 5-6"
+    assert normalize_week_range("WEEK 05-06") == "Week 5-6"
+    with pytest.raises(ValueError):
+        normalize_week_range("Week 5")
+    assert normalize_week_range_or_none("第5-6周") is None
+
+
+@pytest.fixture
+def run_dir(tmp_path):
+    plan = {
+        "title": "T",
+        "milestones": [
+            {"week_range": f"Week {2 * i + 1}-{2 * i + 2}", "goal": "g", "skills": ["s"], "projects": ["p"]}
+            for i in range(6)
+        ],
+        "final_goal": "f",
+    }
+    (tmp_path / "overall_plan.md").write_text(json.dumps(plan), encoding="utf-8")
+    write_run_manifest(str(tmp_path), {
+        "user_background": "bg",
+        "status": "partial",
+        "degradations": [],
+        "pending_periods": ["Week 3-4", "Week 5-6"],
+    })
+    return str(tmp_path)
+
+
+def fake_daily_plans(monkeypatch, failing):
+    calls = []
+
+    def generate_daily_plan(model_client, prompt_manager, user_background, final_plan, week_range):
+        calls.append(week_range)
+        if week_range in failing:
+            raise ConnectionError("503")
+        return f"plan for {week_range}"
+
+    monkeypatch.setattr(workflow, "generate_daily_plan", generate_daily_plan)
+    return calls
+
+
+def test_partial_failure_records_successful_periods(run_dir, monkeypatch):
+    fake_daily_plans(monkeypatch, failing={"Week 5-6"})
+    with pytest.raises(ConnectionError):
+        regenerate_daily_plans(run_dir)
+
+    manifest = load_run_manifest(run_dir)
+    assert manifest["pending_periods"] == ["Week 5-6"]
+    assert manifest["status"] == "partial"
+    assert list(manifest["daily_plans"]) == ["Week 3-4"]
+    assert os.path.exists(os.path.join(run_dir, "daily", "week3-4.md"))
+
+    calls = fake_daily_plans(monkeypatch, failing=set())
+    assert regenerate_daily_plans(run_dir) == {"Week 5-6": "plan for Week 5-6"}
+    assert calls == ["Week 5-6"]
+    manifest = load_run_manifest(run_dir)
+    assert manifest["pending_periods"] == []
+    assert manifest["status"] == "completed"
+
+
+def test_regenerate_rejects_unknown_week_ranges(run_dir, monkeypatch):
+    calls = fake_daily_plans(monkeypatch, failing=set())
+    with pytest.raises(ValueError, match="Week 13-14"):
+        regenerate_daily_plans(run_dir, ["Week 13-14"])
+    assert calls == []
+
+
+def test_nothing_pending_is_not_an_error(run_dir, monkeypatch):
+    manifest = load_run_manifest(run_dir)
+    manifest["pending_periods"] = []
+    write_run_manifest(run_dir, manifest)
+    calls = fake_daily_plans(monkeypatch, failing=set())
+
+    assert regenerate_daily_plans(run_dir) == {}
+    result = CliRunner().invoke(app, ["regenerate", "--run", run_dir, "--pending"])
+    assert result.exit_code == 0
+    assert "没有待生成的双周" in result.output
+    assert calls == []
+    with pytest.raises(ValueError):
+        regenerate_daily_plans(run_dir, [])
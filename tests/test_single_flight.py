@@ -0,0 +1,306 @@
+import asyncio
+import threading
+import time
+
+import httpx
+import openai
+import pytest
+from google.genai import errors as genai_errors
+from langchain_core.messages import AIMessage
+
+from src.deadline import Deadline, DeadlineExceeded
+from src.model_client import AsyncSingleFlight, ModelClient, SingleFlight
+
+
+class SlowChat:
+    """模拟的聊天模型：每次调用耗时delay秒，超过请求的timeout时像HTTP客户端一样中断"""
+
+    def __init__(self, delay: float, failures: int = 0):
+        self.delay = delay
+        self.failures = failures
+        self.calls = 0
+        self.timeouts = []
+
+    def invoke(self, messages, timeout=None, **kwargs):
+        self.calls += 1
+        self.timeouts.append(timeout)
+        if self.calls <= self.failures:
+            raise ConnectionError("connection reset")
+        if timeout is not None and timeout < self.delay:
+            time.sleep(timeout)
+            raise TimeoutError("request timed out")
+        time.sleep(self.delay)
+        return AIMessage(content=f"reply {self.calls}")
+
+    async def ainvoke(self, messages, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return AIMessage(content=f"reply {self.calls}")
+
+
+def make_client(chat, deadline_seconds):
+    client = ModelClient("deepseek", "deepseek-chat", "test-key")
+    client.client = chat
+    client.deadline_client = chat
+    client.deadline = Deadline(deadline_seconds)
+    return client
+
+
+def test_single_flight_shares_result():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        started.set()
+        release.wait()
+        return "result"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("key", fn)))
+    leader.start()
+    started.wait()
+    waiter = threading.Thread(target=lambda: results.append(flight.do("key", fn)))
+    waiter.start()
+    time.sleep(0.05)
+    release.set()
+    leader.join()
+    waiter.join()
+
+    assert len(calls) == 1
+    assert sorted(results, key=lambda r: r[1]) == [("result", False), ("result", True)]
+
+
+def test_single_flight_propagates_leader_error():
+    flight = SingleFlight()
+    started = threading.Event()
+
+    def fn():
+        started.set()
+        time.sleep(0.1)
+        raise ValueError("upstream failed")
+
+    errors = []
+
+    def call():
+        try:
+            flight.do("key", fn)
+        except ValueError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait()
+    waiter = threading.Thread(target=call)
+    waiter.start()
+    leader.join()
+    waiter.join()
+
+    assert len(errors) == 2
+
+
+def test_waiter_retries_when_leader_deadline_expires():
+    chat = SlowChat(delay=0.5)
+    leader = make_client(chat, 0.2)
+    waiter = make_client(chat, 5)
+    results = {}
+
+    def call(name, client):
+        try:
+            results[name] = client.generate("same prompt")
+        except DeadlineExceeded as e:
+            results[name] = e
+
+    leader_thread = threading.Thread(target=call, args=("leader", leader))
+    leader_thread.start()
+    time.sleep(0.05)
+    waiter_thread = threading.Thread(target=call, args=("waiter", waiter))
+    waiter_thread.start()
+    leader_thread.join()
+    waiter_thread.join()
+
+    assert isinstance(results["leader"], DeadlineExceeded)
+    # leader超时后，等待者在自己的截止时间内重新发起调用
+    assert results["waiter"] == "reply 2"
+    assert chat.calls == 2
+
+
+def test_waiter_fails_at_own_deadline():
+    chat = SlowChat(delay=0.5)
+    leader = make_client(chat, 5)
+    waiter = make_client(chat, 0.1)
+    results = {}
+
+    def call(name, client):
+        try:
+            results[name] = client.generate("same prompt")
+        except DeadlineExceeded as e:
+            results[name] = e
+
+    leader_thread = threading.Thread(target=call, args=("leader", leader))
+    leader_thread.start()
+    time.sleep(0.05)
+    started = time.monotonic()
+    call("waiter", waiter)
+    waited = time.monotonic() - started
+    leader_thread.join()
+
+    assert isinstance(results["waiter"], DeadlineExceeded)
+    assert waited < 0.3
+    assert results["leader"] == "reply 1"
+    assert chat.calls == 1
+
+
+def test_invoke_sets_request_timeout_and_stops_at_deadline():
+    chat = SlowChat(delay=1)
+    client = make_client(chat, 0.2)
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        client.generate("prompt")
+
+    # 请求按剩余时间设置超时，到期即中断，不会等待模型返回
+    assert time.monotonic() - started < 0.5
+    assert 0 < chat.timeouts[0] <= 0.2
+
+
+def test_invoke_retries_within_deadline():
+    chat = SlowChat(delay=0.01, failures=2)
+    client = make_client(chat, 5)
+    assert client.generate("prompt") == "reply 3"
+
+    chat = SlowChat(delay=0.01, failures=3)
+    client = make_client(chat, 5)
+    with pytest.raises(ConnectionError):
+        client.generate("prompt")
+    assert chat.calls == 3
+
+
+def test_async_single_flight_shares_result():
+    flight = AsyncSingleFlight()
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def main():
+        return await asyncio.gather(flight.do("key", fn), flight.do("key", fn))
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert sorted(results, key=lambda r: r[1]) == [("result", False), ("result", True)]
+
+
+def test_async_waiter_retries_when_leader_deadline_expires():
+    chat = SlowChat(delay=0.5)
+    leader = make_client(chat, 0.2)
+    waiter = make_client(chat, 5)
+
+    async def main():
+        leader_task = asyncio.create_task(leader.agenerate("same prompt"))
+        await asyncio.sleep(0.05)
+        return await asyncio.gather(leader_task, waiter.agenerate("same prompt"), return_exceptions=True)
+
+    leader_result, waiter_result = asyncio.run(main())
+    assert isinstance(leader_result, DeadlineExceeded)
+    # leader超时后，等待者在自己的截止时间内重新发起调用
+    assert waiter_result == "reply 2"
+    assert chat.calls == 2
+
+
+def test_async_waiter_fails_at_own_deadline():
+    chat = SlowChat(delay=0.5)
+    leader = make_client(chat, 5)
+    waiter = make_client(chat, 0.1)
+
+    async def main():
+        leader_task = asyncio.create_task(leader.agenerate("same prompt"))
+        await asyncio.sleep(0.05)
+        started = time.monotonic()
+        with pytest.raises(DeadlineExceeded):
+            await waiter.agenerate("same prompt")
+        waited = time.monotonic() - started
+        return await leader_task, waited
+
+    leader_result, waited = asyncio.run(main())
+    assert waited < 0.3
+    assert leader_result == "reply 1"
+    assert chat.calls == 1
+
+
+def test_leader_deadline_error_is_not_retried():
+    class ExpiringChat(SlowChat):
+        def invoke(self, messages, timeout=None, **kwargs):
+            self.calls += 1
+            raise DeadlineExceeded("deadline exceeded upstream")
+
+    chat = ExpiringChat(delay=0)
+    client = make_client(chat, None)
+    with pytest.raises(DeadlineExceeded):
+        client.generate("prompt")
+    # 自己发起的调用超时直接抛出，不会反复重试
+    assert chat.calls == 1
+
+
+def test_async_leader_deadline_error_is_not_retried():
+    class ExpiringChat(SlowChat):
+        async def ainvoke(self, messages, **kwargs):
+            self.calls += 1
+            raise DeadlineExceeded("deadline exceeded upstream")
+
+    chat = ExpiringChat(delay=0)
+    client = make_client(chat, None)
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(client.agenerate("prompt"))
+    assert chat.calls == 1
+
+
+class FailingChat:
+    """模拟的聊天模型：依次抛出预设的异常，用完后返回结果"""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = []
+
+    def invoke(self, messages, timeout=None, **kwargs):
+        self.calls.append(time.monotonic())
+        if self.errors:
+            raise self.errors.pop(0)
+        return AIMessage(content="ok")
+
+
+def api_error(cls, status, headers=None):
+    response = httpx.Response(status, headers=headers or {}, request=httpx.Request("POST", "http://test"))
+    return cls("error", response=response, body=None)
+
+
+def test_invoke_does_not_retry_client_errors():
+    errors = (
+        api_error(openai.BadRequestError, 400),
+        api_error(openai.AuthenticationError, 401),
+        genai_errors.ClientError(403, {"error": {"message": "denied", "status": "PERMISSION_DENIED"}}),
+    )
+    for error in errors:
+        chat = FailingChat([error])
+        client = make_client(chat, 5)
+        with pytest.raises(type(error)):
+            client.generate("prompt")
+        assert len(chat.calls) == 1
+
+
+def test_invoke_retries_rate_limit_after_retry_after():
+    chat = FailingChat([api_error(openai.RateLimitError, 429, {"retry-after": "0.2"})])
+    client = make_client(chat, 5)
+    assert client.generate("prompt") == "ok"
+    assert chat.calls[1] - chat.calls[0] >= 0.2
+
+
+def test_invoke_gives_up_when_retry_after_exceeds_deadline():
+    chat = FailingChat([api_error(openai.InternalServerError, 503, {"retry-after": "10"})])
+    client = make_client(chat, 1)
+    with pytest.raises(openai.InternalServerError):
+        client.generate("prompt")
+    assert len(chat.calls) == 1